@@ -17,13 +17,23 @@ app.secret_key = app.config["SECRET_KEY"]
 # ----------------- DATABASE INIT -----------------
 db.init_app(app)
 
+# Per-request SQL count (X-Query-Count header when QUERY_COUNT_HEADER is set)
+from utils import query_counter
+query_counter.init_app(app)
+
 # ----------------- MODELS -----------------
 from models.models import User, Role
+from utils import ref_cache, sequences, upgrades
+# Session listeners: change feed (outbox) and payroll preview marks
+from utils import change_feed, payroll_preview
 
 # ----------------- DEFAULT ADMIN CREATION -----------------
 def create_default_admin():
     with app.app_context():
         db.create_all()  # Ensure tables exist
+        upgrades.run()   # One-off schema / backfill steps for existing databases
+        ref_cache.ensure_versions()
+        sequences.ensure_sequence(sequences.EMP_CODE)
 
         # Ensure Admin role exists
         admin_role = Role.query.filter_by(name="Admin").first()
@@ -120,10 +130,9 @@ def index():
     if not user_id:
         return redirect("/login")
 
-    # Fetch role name safely
+    # Role names come from the process-wide reference cache
     try:
-        role = Role.query.get(role_id)
-        role_name = role.name.lower() if role and role.name else ""
+        role_name = ref_cache.role_name(role_id)
     except Exception:
         role_name = ""
 
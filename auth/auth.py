@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, session, flash, url_for
 from models.models import User
 from models.db import db
+from utils import ref_cache
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -36,7 +37,7 @@ def login():
         # --------------------------
         #   ROLE-BASED REDIRECT
         # --------------------------
-        role = user.role.name.lower()
+        role = ref_cache.role_name(user.role_id)
 
         if role == "admin":
             return redirect("/admin/dashboard")
@@ -0,0 +1,59 @@
+from flask import g, session
+from sqlalchemy.orm import joinedload
+
+from models.models import User, Employee
+
+# -------------------------------
+# Logged-in identity, loaded once per request
+# -------------------------------
+# One query joins users -> roles -> employees -> manager / salary, and the
+# result is kept in flask.g, so every helper below (and the templates
+# reading emp.user, emp.manager, emp.salary, user.role) reuses it.
+
+
+def _load(user_id):
+    return User.query.options(
+        joinedload(User.role),
+        joinedload(User.employee).joinedload(Employee.manager),
+        joinedload(User.employee).joinedload(Employee.salary)
+    ).filter(User.id == user_id).first()
+
+
+def current_user():
+    user_id = session.get("user_id")
+    if not user_id:
+        return None
+
+    cached = g.get("_identity")
+    if cached is None or cached[0] != user_id:
+        cached = g._identity = (user_id, _load(user_id))
+    return cached[1]
+
+
+def current_employee():
+    """
+    Employee profile of the logged-in user, or None.
+    """
+    user = current_user()
+    return user.employee if user else None
+
+
+def _with_role(role):
+    user = current_user()
+    if user and user.employee and user.role and (user.role.name or "").lower() == role:
+        return user.employee
+    return None
+
+
+def current_manager():
+    """
+    Employee profile if the logged-in user has the manager role.
+    """
+    return _with_role("manager")
+
+
+def current_admin():
+    """
+    Employee profile if the logged-in user has the admin role.
+    """
+    return _with_role("admin")
@@ -0,0 +1,100 @@
+"""
+Shared helpers for the query-count benchmarks.
+
+The benchmarks run against an in-memory SQLite database so they can be
+run anywhere:
+
+    python -m benchmarks.leave_summary_queries
+"""
+import os
+from datetime import date
+
+from flask import Flask
+from sqlalchemy import event
+
+from models.db import db
+from models.models import Role, User, Employee
+
+
+def make_app(*blueprints):
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    app = Flask("benchmark", root_path=repo, template_folder="templates")
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        SECRET_KEY="benchmark",
+        TESTING=True
+    )
+    db.init_app(app)
+    for bp in blueprints:
+        app.register_blueprint(bp)
+
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+class QueryCounter:
+    """
+    Counts SQL statements sent to the engine while active.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def seed_people(n, start=1):
+    """
+    Adds roles (first call only) plus n users with employee profiles.
+    Employee 1 manages everyone else.
+    """
+    if not Role.query.first():
+        db.session.add_all([Role(name="Admin"), Role(name="Manager"), Role(name="Employee")])
+        db.session.flush()
+
+    employees = []
+    for i in range(start, start + n):
+        user = User(
+            email=f"user{i}@example.com",
+            display_name=f"User {i}",
+            role_id=2 if i == 1 else 3,
+            password_hash="x"
+        )
+        db.session.add(user)
+        db.session.flush()
+
+        emp = Employee(
+            emp_code=str(i),
+            first_name=f"First{i}",
+            last_name=f"Last{i}",
+            work_email=f"user{i}@example.com",
+            date_of_joining=date(2024, 1, 1),
+            department="Engineering" if i % 2 else "Operations",
+            job_title="Engineer",
+            status="Active",
+            manager_emp_id=None if i == 1 else 1,
+            user_id=user.id
+        )
+        db.session.add(emp)
+        employees.append(emp)
+
+    db.session.commit()
+    return employees
+
+
+def print_table(title, rows):
+    print(title)
+    print(f"{'employees':>10} {'queries':>8}")
+    for n, queries in rows:
+        print(f"{n:>10} {queries:>8}")
@@ -0,0 +1,60 @@
+"""
+SQL statements per page for the logged-in identity.
+
+    python -m benchmarks.identity_queries
+
+Uses the X-Query-Count header from utils/query_counter. The identity
+(user, role, employee, manager, salary) is one joined query per request
+however many times the route and template ask for it.
+"""
+from benchmarks.common import make_app, seed_people
+from models.db import db
+from utils import query_counter
+from utils.ref_cache import ensure_versions
+from routes.employee.employee_routes import employee_bp
+from routes.employee.employee_leaves import employee_lbp
+from routes.employee.attendance_employee import employee_attendance_bp
+from routes.manager.manager_routes import manager_bp
+from routes.manager.manager_leaves import manager_lbp
+from routes.manager.attendance_manager import manager_attendance_bp
+from routes.manager.manager_team import manager_team_bp
+from routes.employee.employee_payroll import employee_payroll_bp
+from routes.manager.manager_payroll import manager_payroll_bp
+from routes.settings.settings import settings_bp
+from auth.auth import auth_bp
+
+PAGES = (
+    (2, 3, "/employee/dashboard"),
+    (2, 3, "/employee/profile"),
+    (2, 3, "/employee/leaves/leave-management"),
+    (2, 3, "/employee/attendance/"),
+    (1, 2, "/manager/dashboard"),
+    (1, 2, "/manager/leaves/leave-management"),
+    (1, 2, "/manager/attendance/"),
+)
+
+
+def main():
+    # Everything the base templates link to
+    app = make_app(auth_bp, settings_bp,
+                   employee_bp, employee_lbp, employee_attendance_bp, employee_payroll_bp,
+                   manager_bp, manager_lbp, manager_attendance_bp, manager_payroll_bp, manager_team_bp)
+    app.config["QUERY_COUNT_HEADER"] = True
+    query_counter.init_app(app)
+
+    with app.app_context():
+        ensure_versions()
+        seed_people(20)
+
+    client = app.test_client()
+    print(f"{'page':<40} {'status':>6} {'queries':>8}")
+    for user_id, role_id, path in PAGES:
+        with client.session_transaction() as sess:
+            sess["user_id"] = user_id
+            sess["role_id"] = role_id
+        resp = client.get(path)
+        print(f"{path:<40} {resp.status_code:>6} {resp.headers.get('X-Query-Count', '-'):>8}")
+
+
+if __name__ == "__main__":
+    main()
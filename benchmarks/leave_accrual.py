@@ -0,0 +1,77 @@
+"""
+Wall time of the year-end accrual job as headcount grows.
+
+    python -m benchmarks.leave_accrual
+
+Each run carries forward from a seeded previous year and accrues the
+next one; the second pass shows a re-run of a completed period with
+--restart (same result, same cost).
+"""
+import time
+from datetime import date
+
+from benchmarks.common import make_app
+from models.db import db
+from models.models import Role, User, Employee, Leavee, LeaveBalance
+from utils.leave_accrual import run_accrual
+
+SIZES = (1000, 5000, 20000)
+YEAR = 2026
+
+
+def bulk_seed(start, n):
+    """
+    Like common.seed_people but with bulk inserts, so 20k rows seed fast.
+    """
+    if not Role.query.first():
+        db.session.add_all([Role(name="Admin"), Role(name="Manager"), Role(name="Employee")])
+        db.session.flush()
+
+    ids = range(start, start + n)
+    db.session.bulk_insert_mappings(User, [
+        {"id": i, "email": f"user{i}@example.com", "display_name": f"User {i}",
+         "role_id": 3, "password_hash": "x"}
+        for i in ids
+    ])
+    db.session.bulk_insert_mappings(Employee, [
+        {"id": i, "emp_code": str(i), "user_id": i, "first_name": f"First{i}", "last_name": "Last",
+         "work_email": f"user{i}@example.com", "date_of_joining": date(2024, 1, 1), "status": "Active"}
+        for i in ids
+    ])
+    db.session.bulk_insert_mappings(LeaveBalance, [
+        {"emp_code": str(i), "leave_type": t, "year": YEAR - 1, "entitled": 6, "consumed": 2, "pending": 0}
+        for i in ids for t in ("Casual Leave", "Sick Leave")
+    ])
+    db.session.bulk_insert_mappings(Leavee, [
+        {"emp_code": str(i), "start_date": date(YEAR, 2, 2), "end_date": date(YEAR, 2, 3),
+         "total_days": 2, "reason": "benchmark", "employee_name": f"First{i} Last",
+         "leave_type": "Casual Leave", "status": "APPROVED"}
+        for i in ids
+    ])
+    db.session.commit()
+
+
+def main():
+    app = make_app()
+    print(f"{'employees':>10} {'first run (s)':>14} {'restart (s)':>12}")
+
+    with app.app_context():
+        seeded = 0
+        for n in SIZES:
+            bulk_seed(seeded + 1, n - seeded)
+            seeded = n
+
+            started = time.perf_counter()
+            run = run_accrual(YEAR, restart=True)
+            first = time.perf_counter() - started
+
+            started = time.perf_counter()
+            run_accrual(YEAR, restart=True)
+            again = time.perf_counter() - started
+
+            assert run.processed == n
+            print(f"{n:>10} {first:>14.2f} {again:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
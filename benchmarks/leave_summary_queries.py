@@ -0,0 +1,61 @@
+"""
+Query count of /admin/leaves/leave/summary as headcount grows.
+
+    python -m benchmarks.leave_summary_queries
+
+The summary reads the leave_balance ledger with one joined query, so the
+count stays flat; the old per-employee version ran 3N+1 queries.
+"""
+from datetime import date
+
+from benchmarks.common import make_app, QueryCounter, seed_people, print_table
+from models.db import db
+from models.models import Leavee
+from routes.admin.admin_leaves import admin_lbp
+from utils.leave_workflow import rebuild_balances
+
+SIZES = (10, 100, 1000)
+
+
+def seed_leaves(employees):
+    for emp in employees:
+        for leave_type in ("Casual Leave", "Sick Leave", "Leave Without Pay"):
+            db.session.add(Leavee(
+                emp_code=emp.emp_code,
+                start_date=date(2026, 2, 2),
+                end_date=date(2026, 2, 3),
+                total_days=2,
+                reason="benchmark",
+                employee_name=f"{emp.first_name} {emp.last_name}",
+                leave_type=leave_type,
+                status="APPROVED"
+            ))
+    db.session.commit()
+    rebuild_balances()
+
+
+def main():
+    app = make_app(admin_lbp)
+    results = []
+
+    with app.app_context():
+        seeded = 0
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = 1
+            sess["role_id"] = 1
+
+        for n in SIZES:
+            seed_leaves(seed_people(n - seeded, start=seeded + 1))
+            seeded = n
+
+            with QueryCounter(db.engine) as counter:
+                resp = client.get("/admin/leaves/leave/summary")
+            assert resp.status_code == 200 and len(resp.json) == n
+            results.append((n, counter.count))
+
+    print_table("GET /admin/leaves/leave/summary", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,43 @@ MYSQL_USER = "hr_user"
 MYSQL_PASSWORD = "YourPassword123!"
 MYSQL_DATABASE = "hr_app"
 SECRET_KEY = "xyz"
+
+# PDF rendering (payslips)
+PDF_RENDER_MAX_CONCURRENCY = 2
+PDF_RENDER_MAX_QUEUE = 8
+PDF_RENDER_QUEUE_TIMEOUT = 30
+PDF_RENDER_RETRY_AFTER = 10
+
+# Background payroll jobs
+PAYROLL_JOB_WORKERS = 1
+PAYROLL_JOB_CHUNK_SIZE = 200
+# A RUNNING job without progress for this long is marked FAILED
+PAYROLL_JOB_STALE_SECONDS = 600
+
+# Annual leave entitlements (days)
+LEAVE_ENTITLEMENTS = {
+    "Casual Leave": 6,
+    "Sick Leave": 6
+}
+
+# Max unused days carried into the next year by the accrual job
+LEAVE_CARRY_FORWARD_CAPS = {
+    "Casual Leave": 3,
+    "Sick Leave": 0
+}
+LEAVE_ACCRUAL_CHUNK_SIZE = 2000
+
+# Max records per POST /api/employees/bulk
+BULK_EMPLOYEE_MAX_RECORDS = 10000
+
+# Admin CSV employee import: rows per batch / password hashing processes
+# (None = one per CPU) / rows per web upload (the CLI has no limit)
+CSV_IMPORT_BATCH_SIZE = 500
+CSV_IMPORT_HASH_WORKERS = None
+CSV_IMPORT_MAX_ROWS = 5000
+
+# /api/changes holds back events younger than this (out-of-order commits)
+CHANGE_FEED_SETTLE_SECONDS = 5
+
+# Add an X-Query-Count header to every response (debugging N+1 queries)
+QUERY_COUNT_HEADER = False
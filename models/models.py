@@ -2,6 +2,7 @@ from datetime import datetime
 from .db import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.dialects.mysql import INTEGER, BIGINT, VARCHAR, TEXT
+from sqlalchemy.orm import validates
 import uuid
 
 # ------------------- Roles -------------------
@@ -45,6 +46,8 @@ class Employee(db.Model):
     __tablename__ = "employees"
     id = db.Column(INTEGER, primary_key=True)
     emp_code = db.Column(VARCHAR(50), unique=True, nullable=False)
+    # Numeric value of emp_code (NULL if not numeric), for index-backed sorting
+    emp_code_num = db.Column(BIGINT().with_variant(db.Integer, "sqlite"), index=True)
 
     user_id = db.Column(INTEGER, db.ForeignKey("users.id"))
     user = db.relationship("User", back_populates="employee")
@@ -64,17 +67,39 @@ class Employee(db.Model):
 )
 
     status = db.Column(VARCHAR(50), default="Active")
-    department = db.Column(VARCHAR(100))
+    department = db.Column(VARCHAR(100), index=True)
     job_title = db.Column(VARCHAR(100))
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     salary = db.relationship("EmployeeSalary", backref="employee", uselist=False)
     account = db.relationship("EmployeeAccount", backref="employee", uselist=False)
 
     # 👇 OPTIONAL — only if you want attendance per employee also
     #attendance_records = db.relationship("Attendance", backref="employee", lazy=True)
 
+    __table_args__ = (
+        # Admin employee list sorts (column, id); emp_code_num, department
+        # and work_email are covered by their own indexes (InnoDB appends id)
+        db.Index('ix_employees_name_sort', 'first_name', 'last_name', 'id'),
+        db.Index('ix_employees_joined_sort', 'date_of_joining', 'id'),
+        db.Index('ix_employees_status_sort', 'status', 'id'),
+    )
+
+    @validates("emp_code")
+    def _sync_emp_code_num(self, key, value):
+        self.emp_code_num = emp_code_number(value)
+        return value
+
+
+def emp_code_number(code):
+    """
+    int(code) for purely numeric codes, else None. Bulk inserts that
+    bypass the ORM set emp_code_num with this.
+    """
+    code = str(code).strip() if code is not None else ""
+    return int(code) if code.isdigit() else None
+
 
 # ------------------- Leave Types -------------------
 
@@ -125,6 +150,73 @@ class Leavee(db.Model):
     level2_decision_date = db.Column(db.DateTime, nullable=True)
     leave_type = db.Column(db.String(30), nullable=False)  # Casual Leave, Sick Leave, Leave Without Pay
 
+    __table_args__ = (
+        # Approver inbox: list and count by approver, filtered on status
+        db.Index('ix_employee_leaves_approver_status', 'current_approver_id', 'status'),
+        # Date-range overlap scans (team calendar)
+        db.Index('ix_employee_leaves_dates', 'start_date', 'end_date'),
+        # Per-employee overlap probe on submit
+        db.Index('ix_employee_leaves_emp_dates', 'emp_code', 'start_date', 'end_date'),
+    )
+
+
+# ------------------- Approved Leave Days -------------------
+class EmployeeLeaveDay(db.Model):
+    """
+    One row per working day of an approved leave, so monthly leave counts
+    are a count over (emp_code, day) instead of a range check per leave.
+    Maintained by utils/leave_days.py.
+    """
+    __tablename__ = "employee_leave_day"
+
+    leave_id = db.Column(db.Integer, db.ForeignKey("employee_leaves.id", ondelete="CASCADE"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    emp_code = db.Column(db.String(20), nullable=False)
+    leave_type = db.Column(db.String(30), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_employee_leave_day_emp_day', 'emp_code', 'day'),
+        db.Index('ix_employee_leave_day_day', 'day'),
+    )
+
+
+# ------------------- Leave Balance Ledger -------------------
+class LeaveBalance(db.Model):
+    """
+    Per-year balance per leave type, kept up to date by the approval
+    handlers (see utils/leave_workflow.py).
+    """
+    __tablename__ = "leave_balance"
+
+    emp_code = db.Column(db.String(50), primary_key=True)
+    leave_type = db.Column(db.String(30), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+
+    entitled = db.Column(db.Float, default=0)          # accrued + carried_forward
+    carried_forward = db.Column(db.Float, default=0)
+    consumed = db.Column(db.Float, default=0)
+    pending = db.Column(db.Float, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class LeaveAccrualRun(db.Model):
+    """
+    Progress of an accrual run (see utils/leave_accrual.py). month is 0 for
+    a full-year grant. last_emp_id lets an interrupted run resume.
+    """
+    __tablename__ = "leave_accrual_run"
+
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True, default=0)
+
+    status = db.Column(db.String(20), default="RUNNING")  # RUNNING, COMPLETED
+    last_emp_id = db.Column(db.Integer, default=0)
+    processed = db.Column(db.Integer, default=0)
+
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
 
 class EmployeeSalary(db.Model):
     __tablename__ = "employee_salary"
@@ -161,6 +253,38 @@ class EmployeeAccount(db.Model):
     account_number = db.Column(db.String(30))
     ifsc_code = db.Column(db.String(15))
     account_holder_name = db.Column(db.String(100))
+
+
+# ------------------- Salary Revisions (bulk appraisals) -------------------
+class SalaryRevision(db.Model):
+    """
+    One bulk change to employee_salary.gross_salary (see
+    utils/salary_revision.py); the rows it touched are snapshotted in
+    salary_revision_audit.
+    """
+    __tablename__ = "salary_revision"
+
+    id = db.Column(db.Integer, primary_key=True)
+    mode = db.Column(db.String(10), nullable=False)          # PERCENT / AMOUNT
+    value = db.Column(db.Float, nullable=False)
+    scope = db.Column(db.Text)                               # JSON filters as submitted
+    note = db.Column(db.String(255))
+    affected = db.Column(db.Integer, default=0)
+    created_by = db.Column(INTEGER, db.ForeignKey("users.id"))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class SalaryRevisionAudit(db.Model):
+    __tablename__ = "salary_revision_audit"
+
+    id = db.Column(db.Integer, primary_key=True)
+    revision_id = db.Column(db.Integer, db.ForeignKey("salary_revision.id"), nullable=False, index=True)
+    emp_code = db.Column(VARCHAR(50), nullable=False, index=True)
+    old_gross_salary = db.Column(db.Float)
+    old_net_salary = db.Column(db.Float)
+    new_gross_salary = db.Column(db.Float)
+
+
 class PayrollRun(db.Model):
     __tablename__ = "payroll_run"
 
@@ -175,4 +299,114 @@ class PayrollRun(db.Model):
         db.UniqueConstraint('month', 'year', name='uq_payroll_run_month_year'),
     )
 
+
+# ------------------- Cache Versions -------------------
+class CacheVersion(db.Model):
+    """
+    One row per cached reference data set (see utils/ref_cache.py). Writers
+    bump the version in their transaction; every worker process compares
+    it with the version its cached copy was loaded at.
+    """
+    __tablename__ = "cache_version"
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ------------------- Deploy Upgrades -------------------
+class SchemaUpgrade(db.Model):
+    """
+    One row per one-off upgrade step already applied to this database
+    (see utils/upgrades.py).
+    """
+    __tablename__ = "schema_upgrade"
+
+    name = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ------------------- Employee Change Feed (outbox) -------------------
+class EmployeeChangeEvent(db.Model):
+    """
+    Append-only log of employee / user identity changes, written in the
+    same transaction as the change (see utils/change_feed.py). The id is
+    the cursor for GET /api/changes.
+    """
+    __tablename__ = "employee_change_events"
+
+    id = db.Column(BIGINT().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True)
+    emp_code = db.Column(VARCHAR(50), nullable=False, index=True)
+    event_type = db.Column(db.String(20), nullable=False)    # CREATED, UPDATED, ENABLED, DISABLED, DELETED
+    fields = db.Column(db.Text)                              # comma-separated changed attributes (UPDATED)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+# ------------------- Sequences -------------------
+class Sequence(db.Model):
+    """
+    Named counters handed out in blocks by utils/sequences.py
+    (e.g. "emp_code"); next_value is the next unused number.
+    """
+    __tablename__ = "sequences"
+
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=1)
+
+
+# ------------------- Payroll Preview Invalidation -------------------
+class PayrollDirtyMark(db.Model):
+    """
+    Rows of the cached payroll previews (utils/payroll_preview.py) made
+    stale by a committed write, so every worker process can refresh them.
+    emp_code / user_id mark one employee; year (and month) with neither
+    marks a whole year or month; all NULL marks every cached month.
+    """
+    __tablename__ = "payroll_dirty_mark"
+
+    id = db.Column(BIGINT().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True)
+    emp_code = db.Column(VARCHAR(50))
+    user_id = db.Column(INTEGER)
+    year = db.Column(db.Integer)
+    month = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+# ------------------- Payroll Jobs (background pay runs) -------------------
+class PayrollJob(db.Model):
+    __tablename__ = "payroll_job"
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    month = db.Column(db.Integer, nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+
+    status = db.Column(db.String(20), default="QUEUED")  # QUEUED, RUNNING, COMPLETED, FAILED
+    total = db.Column(db.Integer, default=0)
+    processed = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)   # refreshed after each chunk; see reap_stale_jobs()
+    finished_at = db.Column(db.DateTime)
+
+
+class PayrollJobRow(db.Model):
+    __tablename__ = "payroll_job_rows"
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), db.ForeignKey("payroll_job.id"), nullable=False, index=True)
+
+    emp_code = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(200))
+    salary_month = db.Column(db.String(30))
+    total_working_days = db.Column(db.Integer)
+    attendance_days = db.Column(db.Integer)
+    paid_leave_days = db.Column(db.Integer)
+    present_days = db.Column(db.Integer)
+    lwp_days = db.Column(db.Integer)
+    absent_days = db.Column(db.Integer)
+    gross_salary = db.Column(db.Float)
+    lwp_deduction = db.Column(db.Float)
+    net_salary = db.Column(db.Float)
+
 from models.attendance import Attendance
@@ -365,16 +365,16 @@ import calendar
 import io
 import csv
  
-from sqlalchemy import func, and_, extract
+from sqlalchemy import and_
  
 from models.models import (
     User,
     Employee,
-    Leavee,
-    Holiday,
     db
 )
 from models.attendance import Attendance
+from utils.business_calendar import working_days_in_month
+from utils.payroll import load_month_aggregates
  
  
 admin_attendance_bp = Blueprint(
@@ -628,20 +628,7 @@ def download_monthly_attendance_summary_csv():
  
     year, month = map(int, month_str.split("-"))
  
-    days_in_month = calendar.monthrange(year, month)[1]
-    cal = calendar.Calendar()
- 
-    sundays = sum(
-        1 for d in cal.itermonthdates(year, month)
-        if d.month == month and d.weekday() == 6
-    )
- 
-    holidays = Holiday.query.filter(
-        extract("month", Holiday.date) == month,
-        extract("year", Holiday.date) == year
-    ).count()
- 
-    total_working_days = days_in_month - sundays - holidays
+    total_working_days = working_days_in_month(year, month)
  
     output = io.StringIO()
     writer = csv.writer(output)
@@ -653,35 +640,13 @@ def download_monthly_attendance_summary_csv():
  
     employees = Employee.query.filter_by(status="Active").all()
  
+    attendance, leaves = load_month_aggregates(year, month)
+
     for emp in employees:
-        attendance_days = db.session.query(
-            func.count(func.distinct(Attendance.date))
-        ).filter(
-            Attendance.user_id == emp.user_id,
-            extract("month", Attendance.date) == month,
-            extract("year", Attendance.date) == year,
-            Attendance.duration_seconds >= 5
-        ).scalar() or 0
- 
-        paid_leave_days = db.session.query(
-            func.coalesce(func.sum(Leavee.total_days), 0)
-        ).filter(
-            Leavee.emp_code == emp.emp_code,
-            Leavee.leave_type.in_(["Casual Leave", "Sick Leave"]),
-            Leavee.status == "Approved",
-            extract("month", Leavee.start_date) == month,
-            extract("year", Leavee.start_date) == year
-        ).scalar() or 0
- 
-        lwp_days = db.session.query(
-            func.coalesce(func.sum(Leavee.total_days), 0)
-        ).filter(
-            Leavee.emp_code == emp.emp_code,
-            Leavee.leave_type == "Leave Without Pay",
-            Leavee.status == "Approved",
-            extract("month", Leavee.start_date) == month,
-            extract("year", Leavee.start_date) == year
-        ).scalar() or 0
+        attendance_days = attendance.get(emp.user_id, 0)
+        leave = leaves.get(emp.emp_code, {"paid": 0, "lwp": 0})
+        paid_leave_days = leave["paid"]
+        lwp_days = leave["lwp"]
  
         present_days = int(attendance_days + paid_leave_days)
         absent_days = max(total_working_days - present_days - int(lwp_days), 0)
@@ -712,53 +677,18 @@ def get_monthly_attendance_summary_json():
  
     year, month = map(int, month_str.split("-"))
  
-    days_in_month = calendar.monthrange(year, month)[1]
-    cal = calendar.Calendar()
- 
-    sundays = sum(
-        1 for d in cal.itermonthdates(year, month)
-        if d.month == month and d.weekday() == 6
-    )
- 
-    holidays = Holiday.query.filter(
-        extract("month", Holiday.date) == month,
-        extract("year", Holiday.date) == year
-    ).count()
- 
-    total_working_days = days_in_month - sundays - holidays
+    total_working_days = working_days_in_month(year, month)
  
     employees = Employee.query.filter_by(status="Active").all()
     data = []
  
+    attendance, leaves = load_month_aggregates(year, month)
+
     for emp in employees:
-        attendance_days = db.session.query(
-            func.count(func.distinct(Attendance.date))
-        ).filter(
-            Attendance.user_id == emp.user_id,
-            extract("month", Attendance.date) == month,
-            extract("year", Attendance.date) == year,
-            Attendance.duration_seconds >= 5
-        ).scalar() or 0
- 
-        paid_leave_days = db.session.query(
-            func.coalesce(func.sum(Leavee.total_days), 0)
-        ).filter(
-            Leavee.emp_code == emp.emp_code,
-            Leavee.leave_type.in_(["Casual Leave", "Sick Leave"]),
-            Leavee.status == "Approved",
-            extract("month", Leavee.start_date) == month,
-            extract("year", Leavee.start_date) == year
-        ).scalar() or 0
- 
-        lwp_days = db.session.query(
-            func.coalesce(func.sum(Leavee.total_days), 0)
-        ).filter(
-            Leavee.emp_code == emp.emp_code,
-            Leavee.leave_type == "Leave Without Pay",
-            Leavee.status == "Approved",
-            extract("month", Leavee.start_date) == month,
-            extract("year", Leavee.start_date) == year
-        ).scalar() or 0
+        attendance_days = attendance.get(emp.user_id, 0)
+        leave = leaves.get(emp.emp_code, {"paid": 0, "lwp": 0})
+        paid_leave_days = leave["paid"]
+        lwp_days = leave["lwp"]
  
         present_days = int(attendance_days + paid_leave_days)
         absent_days = max(total_working_days - present_days - int(lwp_days), 0)
@@ -1,6 +1,10 @@
 from flask import Blueprint, render_template, session, redirect, url_for, jsonify, request
-from models.models import Employee, Leavee, Holiday, db
+from models.models import Employee, Leavee, Holiday, LeaveBalance, db
 from datetime import datetime
+import click
+from sqlalchemy import and_
+from utils import approver_inbox, leave_accrual, leave_days, leave_workflow, ref_cache, team_calendar
+from utils.leave_policy import entitlements, opening_balances
 
 admin_lbp = Blueprint(
     "admin_leaves",
@@ -8,17 +12,6 @@ admin_lbp = Blueprint(
     url_prefix="/admin/leaves"
 )
 
-# ---------------- Helper ----------------
-def current_admin():
-    """
-    Returns the Employee object of the current admin based on session.
-    """
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-    emp = Employee.query.filter_by(user_id=user_id, role_id=1).first()  # role_id=1 → admin
-    return emp
-
 # ---------------- BEFORE REQUEST ----------------
 @admin_lbp.before_request
 def check_admin():
@@ -30,7 +23,7 @@ def check_admin():
 # ---------------- LEAVE MANAGEMENT PAGE ----------------
 @admin_lbp.route("/leave-management")
 def leave_management():
-    holidays = Holiday.query.all()
+    holidays = ref_cache.holidays()
     return render_template(
         "admin/leave_management.html",
         holidays=holidays
@@ -61,93 +54,144 @@ def pending_approvals():
         for l in pending
     ])
 
+# ---------------- PENDING COUNT ----------------
+@admin_lbp.route("/leave/pending-count")
+def pending_count():
+    return jsonify(approver_inbox.pending_counts(session.get("user_id")))
+
+# ---------------- TEAM / DEPARTMENT CALENDAR ----------------
+@admin_lbp.route("/leave/team-calendar")
+def team_leave_calendar():
+    try:
+        start, end = team_calendar.parse_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(team_calendar.team_calendar(
+        start, end,
+        manager_emp_id=request.args.get("manager_emp_id", type=int),
+        department=request.args.get("department") or None
+    ))
+
+# ---------------- OVERLAPPING REQUESTS ----------------
+def _overlap_json(row):
+    return {
+        "id": row.id,
+        "leave_type": row.leave_type,
+        "status": row.status,
+        "start": row.start_date.strftime("%Y-%m-%d"),
+        "end": row.end_date.strftime("%Y-%m-%d")
+    }
+
+
+@admin_lbp.route("/leave/overlaps")
+def leave_overlaps():
+    return jsonify([
+        {"emp_code": a.emp_code, "first": _overlap_json(a), "second": _overlap_json(b)}
+        for a, b in leave_workflow.scan_overlaps()
+    ])
+
 # ---------------- APPROVE / REJECT ----------------
 @admin_lbp.route("/leave/approve/<int:leave_id>", methods=["POST"])
 def approve_leave(leave_id):
     user_id = session.get("user_id")
-    leave = Leavee.query.get_or_404(leave_id)
+    # Locked: a concurrent decision (or double click) waits here, then sees
+    # the leave has moved on and fails the approver check
+    leave = Leavee.query.filter_by(id=leave_id).with_for_update().populate_existing().first_or_404()
 
     if leave.current_approver_id != user_id:
         return jsonify({"error": "Not authorized"}), 403
 
-    if leave.status == "PENDING_L1":
-        leave.status = "PENDING_L2"
-        leave.level1_decision_date = datetime.now()
-        leave.current_approver_id = leave.level2_approver_id
-
-    elif leave.status == "PENDING_L2":
-        leave.status = "APPROVED"
-        leave.level2_decision_date = datetime.now()
-        leave.current_approver_id = None
-
+    leave_workflow.approve(leave)
     db.session.commit()
     return jsonify({"success": True})
 
 @admin_lbp.route("/leave/reject/<int:leave_id>", methods=["POST"])
 def reject_leave(leave_id):
     user_id = session.get("user_id")
-    leave = Leavee.query.get_or_404(leave_id)
+    leave = Leavee.query.filter_by(id=leave_id).with_for_update().populate_existing().first_or_404()
 
     if leave.current_approver_id != user_id:
         return jsonify({"error": "Not authorized"}), 403
 
-    if leave.status == "PENDING_L1":
-        leave.status = "REJECTED_L1"
-        leave.level1_decision_date = datetime.now()
-    elif leave.status == "PENDING_L2":
-        leave.status = "REJECTED_L2"
-        leave.level2_decision_date = datetime.now()
-
-    leave.current_approver_id = None
+    leave_workflow.reject(leave)
     db.session.commit()
     return jsonify({"success": True})
 
+# ---------------- BULK APPROVE / REJECT ----------------
+# Body: {"ids": [1, 2, 3]}  →  {"results": [{"id", "result", "status"}, ...]}
+@admin_lbp.route("/leave/bulk-approve", methods=["POST"])
+def bulk_approve_leaves():
+    return _bulk_decide(approve=True)
+
+
+@admin_lbp.route("/leave/bulk-reject", methods=["POST"])
+def bulk_reject_leaves():
+    return _bulk_decide(approve=False)
+
+
+def _bulk_decide(approve):
+    user_id = session.get("user_id")
+
+    ids = (request.get_json(silent=True) or {}).get("ids")
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        return jsonify({"error": "ids must be a list of leave ids"}), 400
+    if len(ids) > leave_workflow.MAX_BULK_DECISIONS:
+        return jsonify({"error": f"At most {leave_workflow.MAX_BULK_DECISIONS} leaves per request"}), 413
+
+    results = leave_workflow.bulk_decide(user_id, ids, approve=approve)
+    db.session.commit()
+
+    return jsonify({"results": results})
+
+
 # ---------------- EMPLOYEE LEAVE SUMMARY ----------------
 @admin_lbp.route("/leave/summary")
 def leave_summary():
-    employees = Employee.query.all()
-    summary = []
+    year = request.args.get("year", datetime.now().year, type=int)
+
+    # Employees with their ledger rows for the year (one query)
+    rows = db.session.query(Employee, LeaveBalance).outerjoin(
+        LeaveBalance,
+        and_(LeaveBalance.emp_code == Employee.emp_code, LeaveBalance.year == year)
+    ).order_by(Employee.id).all()
+
+    by_emp = {}
+    for e, balance in rows:
+        entry = by_emp.setdefault(e.emp_code, {"emp": e, "balances": {}})
+        if balance:
+            entry["balances"][balance.leave_type] = balance
+
+    # What the ledger row will open with, for rows not created yet
+    opening = opening_balances(
+        (code, leave_type, year)
+        for code, entry in by_emp.items()
+        for leave_type in entitlements()
+        if leave_type not in entry["balances"]
+    )
+
+    def totals(emp_code, balances, leave_type):
+        b = balances.get(leave_type)
+        entitled = b.entitled if b else opening.get((emp_code, leave_type, year), (0, 0))[0]
+        consumed = b.consumed if b else 0
+        return _num(entitled), _num(consumed), _num(entitled - consumed)
 
-    TOTAL_CL = 6
-    TOTAL_SL = 6
-
-    for e in employees:
-        emp = e.emp_code
-
-        # CASUAL LEAVE CONSUMED
-        cl_consumed = db.session.query(
-            db.func.coalesce(db.func.sum(Leavee.total_days), 0)
-        ).filter_by(
-            emp_code=emp, status="APPROVED", leave_type="Casual Leave"
-        ).scalar()
-
-        # SICK LEAVE CONSUMED
-        sl_consumed = db.session.query(
-            db.func.coalesce(db.func.sum(Leavee.total_days), 0)
-        ).filter_by(
-            emp_code=emp, status="APPROVED", leave_type="Sick Leave"
-        ).scalar()
-
-        # LWP
-        lwp = db.session.query(
-            db.func.coalesce(db.func.sum(Leavee.total_days), 0)
-        ).filter_by(
-            emp_code=emp, status="APPROVED", leave_type="Leave Without Pay"
-        ).scalar()
-
-        # Remaining leaves
-        cl_remaining = TOTAL_CL - cl_consumed
-        sl_remaining = TOTAL_SL - sl_consumed
+    summary = []
+    for emp, entry in by_emp.items():
+        e, balances = entry["emp"], entry["balances"]
+        total_cl, cl_consumed, cl_remaining = totals(emp, balances, "Casual Leave")
+        total_sl, sl_consumed, sl_remaining = totals(emp, balances, "Sick Leave")
+        _, lwp, _ = totals(emp, balances, "Leave Without Pay")
 
         summary.append({
             "emp_code": emp,
             "name": f"{e.first_name} {e.last_name}",
 
-            "total_casual": TOTAL_CL,
+            "total_casual": total_cl,
             "casual_consumed": cl_consumed,
             "casual_remaining": cl_remaining,
 
-            "total_sick": TOTAL_SL,
+            "total_sick": total_sl,
             "sick_consumed": sl_consumed,
             "sick_remaining": sl_remaining,
 
@@ -156,6 +200,59 @@ def leave_summary():
 
     return jsonify(summary)
 
+
+def _num(value):
+    return int(value) if float(value).is_integer() else value
+
+
+# ---------------- CLI: flask admin_leaves rebuild-balances ----------------
+@admin_lbp.cli.command("rebuild-balances")
+@click.option("--year", type=int, default=None, help="Only rebuild this year.")
+def rebuild_balances_command(year):
+    """Recompute the leave_balance ledger from employee_leaves."""
+    count = leave_workflow.rebuild_balances(year)
+    click.echo(f"Rebuilt {count} leave balance rows.")
+
+# ---------------- CLI: flask admin_leaves route-self-approvals ----------------
+@admin_lbp.cli.command("route-self-approvals")
+def route_self_approvals_command():
+    """Move legacy self-assigned pending leaves past their own approval step."""
+    moved = leave_workflow.route_self_approvals()
+    click.echo(f"Re-routed {moved} leave request(s).")
+
+# ---------------- CLI: flask admin_leaves accrue ----------------
+@admin_lbp.cli.command("accrue")
+@click.option("--year", type=int, required=True, help="Leave year to accrue.")
+@click.option("--month", type=int, default=None, help="Accrue through this month (default: full year).")
+@click.option("--restart", is_flag=True, help="Redo a completed run from the first employee.")
+def accrue_command(year, month, restart):
+    """Accrue entitlements and carry forward last year's unused days."""
+    if month is not None and not 1 <= month <= 12:
+        raise click.BadParameter("month must be 1-12", param_hint="--month")
+
+    run = leave_accrual.run_accrual(year, month, restart=restart)
+    click.echo(f"Accrual {year}/{month or 'year'}: {run.status}, {run.processed} employee(s).")
+
+# ---------------- CLI: flask admin_leaves find-overlaps ----------------
+@admin_lbp.cli.command("find-overlaps")
+def find_overlaps_command():
+    """List employees with overlapping approved / pending requests."""
+    count = 0
+    for a, b in leave_workflow.scan_overlaps():
+        click.echo(f"{a.emp_code}: #{a.id} {a.start_date}..{a.end_date} ({a.status}) "
+                   f"overlaps #{b.id} {b.start_date}..{b.end_date} ({b.status})")
+        count += 1
+    click.echo(f"{count} overlapping pair(s).")
+
+# ---------------- CLI: flask admin_leaves rebuild-leave-days ----------------
+@admin_lbp.cli.command("rebuild-leave-days")
+@click.option("--year", type=int, default=None, help="Only rebuild this year.")
+def rebuild_leave_days_command(year):
+    """Re-expand approved leaves into employee_leave_day."""
+    count = leave_days.rebuild(year)
+    click.echo(f"Wrote {count} leave day rows.")
+
+
 @admin_lbp.route("/add-holiday", methods=["GET", "POST"])
 def add_holiday():
     if request.method == "POST":
@@ -166,7 +263,10 @@ def add_holiday():
             
             return redirect(url_for("admin_leaves.add_holiday"))
 
-        new_holiday = Holiday(occasion=occasion, date=date)
+        holiday_date = datetime.strptime(date, "%Y-%m-%d").date()
+        # Leaves spanning the day no longer take it (days, ledger, day rows)
+        leave_workflow.apply_new_holiday(holiday_date)
+        new_holiday = Holiday(occasion=occasion, date=holiday_date)
         db.session.add(new_holiday)
         db.session.commit()
 
@@ -1,18 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, session
 from models.db import db
-from models.models import (
-    Employee,
-    
-    Leavee,
-    EmployeeSalary,
-    EmployeeAccount,
-    PayrollRun,
-    Holiday,
-    Attendance
-)
-from sqlalchemy import extract, func
-import calendar
+from models.models import PayrollRun, PayrollJob
 from datetime import datetime
+import csv
+import io
+from utils.pdf_render import get_render_gate
+from utils import payroll_preview, payroll_jobs
+from utils.payroll import iter_payroll_range
 
 admin_payroll_bp = Blueprint(
     "admin_payroll",
@@ -20,6 +14,17 @@ admin_payroll_bp = Blueprint(
     url_prefix="/admin/payroll"
 )
 
+# ======================================================
+# ADMIN ACCESS CHECK
+# ======================================================
+@admin_payroll_bp.before_request
+def check_admin():
+    if "user_id" not in session:
+        return redirect(url_for("auth.login"))
+    if session.get("role_id") != 1:
+        return "Access denied", 403
+
+
 # ======================================================
 # PAYROLL DASHBOARD
 # ======================================================
@@ -42,88 +47,9 @@ def generate_payrun():
         return redirect(url_for("admin_payroll.payroll_dashboard"))
 
     year, month = map(int, pay_month.split("-"))
-    days_in_month = calendar.monthrange(year, month)[1]
-
-    # Count Sundays
-    cal = calendar.Calendar()
-    sundays = sum(1 for day in cal.itermonthdates(year, month) if day.month == month and day.weekday() == 6)
-
-    # Count Holidays
-    holidays = Holiday.query.filter(
-        extract("month", Holiday.date) == month,
-        extract("year", Holiday.date) == year
-    ).count()
-
-    total_working_days = days_in_month - sundays - holidays
-    payroll_data = []
-
-    employees = Employee.query.filter(Employee.status == "Active").all()
-
-    for emp in employees:
-        salary = EmployeeSalary.query.filter_by(emp_code=emp.emp_code).first()
-        if not salary:
-            continue
-
-        # Attendance days (>=5 seconds)
-        attendance_days = db.session.query(
-            func.count(func.distinct(Attendance.date))
-        ).filter(
-            Attendance.user_id == emp.user_id,
-            extract("month", Attendance.date) == month,
-            extract("year", Attendance.date) == year,
-            Attendance.duration_seconds >= 5
-        ).scalar() or 0
-
-        # Paid leaves (CL + SL)
-        paid_leave_days = db.session.query(
-            func.coalesce(func.sum(Leavee.total_days), 0)
-        ).filter(
-            Leavee.emp_code == emp.emp_code,
-            Leavee.leave_type.in_(["Casual Leave", "Sick Leave"]),
-            Leavee.status == "Approved",
-            extract("month", Leavee.start_date) == month,
-            extract("year", Leavee.start_date) == year
-        ).scalar() or 0
-
-        present_days = int(attendance_days + paid_leave_days)
-
-        # LWP days
-        lwp_days = db.session.query(
-            func.coalesce(func.sum(Leavee.total_days), 0)
-        ).filter(
-            Leavee.emp_code == emp.emp_code,
-            Leavee.leave_type == "Leave Without Pay",
-            Leavee.status == "Approved",
-            extract("month", Leavee.start_date) == month,
-            extract("year", Leavee.start_date) == year
-        ).scalar() or 0
-        lwp_days = int(lwp_days)
-
-        # Absent days
-        absent_days = total_working_days - present_days - lwp_days
-        if absent_days < 0:
-            absent_days = 0
-
-        # Salary calculation
-        monthly_salary = float(salary.gross_salary)
-        salary_per_day = round(monthly_salary / total_working_days, 2)
-        net_salary = round(present_days * salary_per_day, 2)
-        lwp_deduction = round(monthly_salary - net_salary, 2)
-
-        payroll_data.append({
-            "emp_code": emp.emp_code,
-            "name": f"{emp.first_name} {emp.last_name}",
-            "salary_month": f"{calendar.month_name[month]} {year}",
-            "total_working_days": total_working_days,
-            "attendance_days": attendance_days,
-            "paid_leave_days": paid_leave_days,
-            "present_days": present_days,
-            "lwp_days": lwp_days,
-            "absent_days": absent_days,
-            "gross_salary": round(monthly_salary, 2),
-            "lwp_deduction": lwp_deduction,
-            "net_salary": net_salary
-        })
+
+    # Cached per month; only rows touched since the last run are recomputed
+    payroll_data = payroll_preview.get_preview(year, month)
 
     # 🔹 Check payroll approval status
     payrun = PayrollRun.query.filter_by(
@@ -140,6 +66,118 @@ def generate_payrun():
         selected_year=year,
         payroll_approved=payroll_approved
     )
+# ======================================================
+# BACKGROUND PAY RUN JOBS
+# ======================================================
+@admin_payroll_bp.route("/jobs", methods=["POST"])
+def start_payroll_job():
+    pay_month = request.form.get("pay_month") or (request.get_json(silent=True) or {}).get("pay_month")
+
+    try:
+        year, month = map(int, pay_month.split("-"))
+    except (AttributeError, ValueError):
+        return jsonify({"error": "pay_month must be YYYY-MM"}), 400
+
+    job = payroll_jobs.start_job(year, month)
+
+    return jsonify({
+        "job_id": job.id,
+        "status_url": url_for("admin_payroll.payroll_job_status", job_id=job.id),
+        "rows_url": url_for("admin_payroll.payroll_job_rows", job_id=job.id)
+    }), 202
+
+
+@admin_payroll_bp.route("/jobs/<string:job_id>", methods=["GET"])
+def payroll_job_status(job_id):
+    job = PayrollJob.query.get_or_404(job_id)
+    if job.status in ("QUEUED", "RUNNING") and payroll_jobs.reap_stale_jobs():
+        db.session.refresh(job)
+
+    status = payroll_jobs.job_status(job)
+
+    payrun = PayrollRun.query.filter_by(month=job.month, year=job.year).first()
+    status["payroll_approved"] = payrun.approved if payrun else False
+
+    return jsonify(status)
+
+
+@admin_payroll_bp.route("/jobs/<string:job_id>/rows", methods=["GET"])
+def payroll_job_rows(job_id):
+    PayrollJob.query.get_or_404(job_id)
+
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 100, type=int), 1), 500)
+
+    rows, has_more = payroll_jobs.job_rows(job_id, page, per_page)
+
+    return jsonify({
+        "page": page,
+        "per_page": per_page,
+        "has_more": has_more,
+        "rows": rows
+    })
+
+
+# ======================================================
+# MULTI-MONTH BATCH (CSV)
+# ======================================================
+MAX_BATCH_MONTHS = 36
+
+BATCH_CSV_COLUMNS = [
+    ("emp_code", "Emp Code"),
+    ("name", "Name"),
+    ("salary_month", "Salary Month"),
+    ("gross_salary", "Monthly Salary"),
+    ("total_working_days", "Total Working Days"),
+    ("attendance_days", "Attendance Days"),
+    ("paid_leave_days", "Paid Leave Days"),
+    ("present_days", "Present Days"),
+    ("absent_days", "Absent Days"),
+    ("lwp_days", "LWP Days"),
+    ("lwp_deduction", "LWP Deduction"),
+    ("net_salary", "Net Salary")
+]
+
+
+@admin_payroll_bp.route("/batch.csv", methods=["GET"])
+def payroll_batch_csv():
+    """
+    /admin/payroll/batch.csv?from=YYYY-MM&to=YYYY-MM
+    """
+    try:
+        start_year, start_month = map(int, request.args["from"].split("-"))
+        end_year, end_month = map(int, request.args["to"].split("-"))
+        datetime(start_year, start_month, 1)
+        datetime(end_year, end_month, 1)
+    except (KeyError, ValueError):
+        return jsonify({"error": "from and to must be YYYY-MM"}), 400
+
+    span = (end_year - start_year) * 12 + (end_month - start_month) + 1
+    if span < 1 or span > MAX_BATCH_MONTHS:
+        return jsonify({"error": f"Range must cover 1 to {MAX_BATCH_MONTHS} months"}), 400
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+
+        writer.writerow([title for _, title in BATCH_CSV_COLUMNS])
+        for row in iter_payroll_range(start_year, start_month, end_year, end_month):
+            writer.writerow([row[key] for key, _ in BATCH_CSV_COLUMNS])
+            if buf.tell() > 64 * 1024:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    filename = f"payroll_{request.args['from']}_to_{request.args['to']}.csv"
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+# ======================================================
 # APPROVE PAY RUN
 # ======================================================
 @admin_payroll_bp.route("/approve", methods=["POST"])
@@ -168,3 +206,11 @@ def approve_payrun():
 
     flash("Payroll approved successfully!", "success")
     return redirect(url_for("admin_payroll.payroll_dashboard"))
+
+
+# ======================================================
+# PAYSLIP RENDER METRICS
+# ======================================================
+@admin_payroll_bp.route("/render-stats", methods=["GET"])
+def render_stats():
+    return jsonify(get_render_gate().stats())
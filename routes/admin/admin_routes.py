@@ -1,15 +1,22 @@
-from flask import Blueprint, render_template, session, redirect, url_for, request, flash, jsonify
+from flask import Blueprint, render_template, session, redirect, url_for, request, flash, jsonify, Response, current_app
 from models.models import (
     Employee,
     User,
     Role,
     LeaveApprovalConfig,
     EmployeeSalary,
-    EmployeeAccount
+    EmployeeAccount,
+    SalaryRevision
 )
 from models.db import db
-from sqlalchemy import cast, Integer
-from datetime import datetime   # ✅ REQUIRED
+from utils import employee_bulk, people_search, salary_revision, sequences, upgrades
+from datetime import datetime, date   # ✅ REQUIRED
+from sqlalchemy import and_, or_, false
+import base64
+import click
+import io
+import csv
+import json
  
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
  
@@ -37,8 +44,108 @@ def dashboard():
 # =====================================================
 @admin_bp.route("/employees")
 def employees():
-    employees = Employee.query.order_by(cast(Employee.emp_code, Integer)).all()
-    return render_template("admin/employees.html", employees=employees)
+    # Rows are fetched page by page from employees_data()
+    return render_template("admin/employees.html")
+ 
+ 
+# Sortable columns, each backed by an index ending in id (see Employee);
+# id breaks ties so pages never overlap
+EMPLOYEE_SORTS = {
+    "code": [Employee.emp_code_num],
+    "name": [Employee.first_name, Employee.last_name],
+    "email": [Employee.work_email],
+    "department": [Employee.department],
+    "joined": [Employee.date_of_joining],
+    "status": [Employee.status]
+}
+EMPLOYEE_PAGE_SIZES = (25, 50, 100)
+
+
+# Keyset pagination: the client sends back the cursor of the page it has
+# (the last row's sort values and id) instead of a page number, so a deep
+# page is one index range read rather than an OFFSET over every row
+# before it.
+def _encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, date) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor, columns):
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("bad cursor")
+    return [
+        date.fromisoformat(v) if v is not None and isinstance(c.type, db.Date) else v
+        for c, v in zip(columns, values)
+    ]
+
+
+def _after(columns, values, descending):
+    """
+    Rows that come after `values` in ORDER BY columns. NULLs sort first
+    ascending and last descending, as in MySQL.
+    """
+    column, value = columns[0], values[0]
+    rest = _after(columns[1:], values[1:], descending) if len(columns) > 1 else None
+
+    if value is None:
+        beyond = None if descending else column.isnot(None)
+        same = column.is_(None)
+    elif descending:
+        beyond = or_(column < value, column.is_(None))
+        same = column == value
+    else:
+        beyond = column > value
+        same = column == value
+
+    parts = [p for p in (beyond, and_(same, rest) if rest is not None else None) if p is not None]
+    return or_(*parts) if parts else false()
+
+
+@admin_bp.route("/employees/data")
+def employees_data():
+    per_page = request.args.get("per_page", EMPLOYEE_PAGE_SIZES[0], type=int)
+    if per_page not in EMPLOYEE_PAGE_SIZES:
+        per_page = EMPLOYEE_PAGE_SIZES[0]
+
+    sort = request.args.get("sort", "code")
+    columns = EMPLOYEE_SORTS.get(sort, EMPLOYEE_SORTS["code"]) + [Employee.id]
+    descending = request.args.get("dir") == "desc"
+    order = [c.desc() if descending else c.asc() for c in columns]
+
+    query = db.session.query(
+        Employee.id, Employee.emp_code, Employee.first_name, Employee.last_name,
+        Employee.work_email, Employee.department, Employee.date_of_joining, Employee.status,
+        *columns
+    )
+    cursor = request.args.get("after")
+    if cursor:
+        try:
+            query = query.filter(_after(columns, _decode_cursor(cursor, columns), descending))
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    total = db.session.query(db.func.count(Employee.id)).scalar()
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    return jsonify({
+        "total": total,
+        "per_page": per_page,
+        "next_cursor": _encode_cursor(rows[-1][-len(columns):]) if more else None,
+        "rows": [
+            {
+                "emp_code": r.emp_code,
+                "name": f"{r.first_name} {r.last_name}",
+                "work_email": r.work_email,
+                "department": r.department,
+                "date_of_joining": str(r.date_of_joining) if r.date_of_joining else "",
+                "status": r.status
+            }
+            for r in rows
+        ]
+    })
  
  
 # =====================================================
@@ -59,9 +166,17 @@ def add_employee():
         db.session.add(user)
         db.session.flush()
  
+        # ---------- EMP CODE ----------
+        # Blank = next from the sequence; a hand-entered code moves it along
+        emp_code = (request.form.get("emp_code") or "").strip()
+        if emp_code:
+            sequences.note_emp_code(emp_code)
+        else:
+            emp_code = sequences.allocate_emp_codes(1)[0]
+ 
         # ---------- EMPLOYEE ----------
         emp = Employee(
-            emp_code=request.form.get("emp_code"),
+            emp_code=emp_code,
             first_name=request.form.get("first_name"),
             last_name=request.form.get("last_name"),
             work_email=request.form.get("work_email"),
@@ -111,6 +226,42 @@ def add_employee():
     return redirect(url_for("admin.employees"))
  
  
+# =====================================================
+# IMPORT EMPLOYEES (CSV)
+# =====================================================
+@admin_bp.route("/employees/import", methods=["POST"])
+def import_employees():
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify({"error": "Choose a CSV file"}), 400
+ 
+    # Read as a stream; the upload is never held in memory as a whole
+    lines = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+    max_rows = current_app.config.get("CSV_IMPORT_MAX_ROWS", employee_bulk.DEFAULT_CSV_MAX_ROWS)
+    try:
+        # Counted before anything is written; the import commits per batch
+        if employee_bulk.count_csv_rows(lines) > max_rows:
+            return jsonify({
+                "error": f"At most {max_rows} rows per upload; "
+                         "use `flask admin import-employees` for larger files"
+            }), 413
+        lines.seek(0)
+        report = employee_bulk.import_csv(lines)
+    except (employee_bulk.BulkRecordError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": str(e)}), 400
+ 
+    return jsonify(report)
+ 
+ 
+@admin_bp.route("/employees/import/template")
+def import_employees_template():
+    return Response(
+        ",".join(employee_bulk.CSV_COLUMNS) + "\r\n",
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=employee_import_template.csv"}
+    )
+ 
+ 
 # =====================================================
 # VIEW EMPLOYEE (JSON)
 # =====================================================
@@ -219,12 +370,43 @@ def edit_employee(emp_code):
     return redirect(url_for("admin.employees"))
  
  
+# =====================================================
+# BULK SALARY REVISIONS
+# =====================================================
+# JSON body: {"mode": "PERCENT" | "AMOUNT", "value": 8,
+#             "departments": [...], "job_titles": [...], "emp_codes": [...],
+#             "note": "..."}
+@admin_bp.route("/salary-revisions/preview", methods=["POST"])
+def preview_salary_revision():
+    try:
+        mode, value, scope = salary_revision.parse_revision(request.get_json(silent=True) or {})
+    except salary_revision.RevisionError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(salary_revision.preview(mode, value, scope))
+ 
+ 
+@admin_bp.route("/salary-revisions", methods=["POST"])
+def apply_salary_revision():
+    data = request.get_json(silent=True) or {}
+    try:
+        mode, value, scope = salary_revision.parse_revision(data)
+        revision = salary_revision.apply(mode, value, scope, data.get("note"), session.get("user_id"))
+    except salary_revision.RevisionError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(salary_revision.revision_json(revision)), 201
+ 
+ 
+@admin_bp.route("/salary-revisions", methods=["GET"])
+def list_salary_revisions():
+    revisions = SalaryRevision.query.order_by(SalaryRevision.id.desc()).limit(50).all()
+    return jsonify([salary_revision.revision_json(r) for r in revisions])
+ 
+ 
 # =====================================================
 # CONFIGURE LEAVE APPROVALS
 # =====================================================
 @admin_bp.route("/configure-approvals", methods=["GET", "POST"])
 def configure_approvals():
-    users = User.query.all()
     config = LeaveApprovalConfig.query.first()
  
     if not config:
@@ -249,10 +431,62 @@ def configure_approvals():
         flash("Approval workflow updated successfully!", "success")
         return redirect(url_for("admin.configure_approvals"))
  
+    # Only the selected approvers; others are found with the typeahead
     return render_template(
         "admin/configure_approvals.html",
-        users=users,
-        config=config
+        config=config,
+        level1_user=db.session.get(User, config.level1_approver_id) if config.level1_approver_id else None,
+        level2_user=db.session.get(User, config.level2_approver_id) if config.level2_approver_id else None
     )
  
  
+# =====================================================
+# PEOPLE SEARCH (typeahead)
+# =====================================================
+@admin_bp.route("/people/search")
+def people_search_json():
+    q = (request.args.get("q") or "").strip()
+    limit = request.args.get("limit", people_search.DEFAULT_LIMIT, type=int)
+    active_only = request.args.get("active") == "1"
+ 
+    results = people_search.search(q, limit, active_only) if q else []
+    return jsonify({
+        "results": [
+            {
+                "user_id": p.user_id,
+                "emp_code": p.emp_code,
+                "name": p.name,
+                "email": p.email,
+                "department": p.department,
+                "job_title": p.job_title,
+                "status": p.status,
+                "date_of_joining": str(p.date_of_joining) if p.date_of_joining else ""
+            }
+            for p in results
+        ]
+    })
+ 
+ 
+ 
+ 
+# ---------------- CLI: flask admin backfill-emp-code-num ----------------
+@admin_bp.cli.command("backfill-emp-code-num")
+@click.option("--chunk-size", type=int, default=1000)
+def backfill_emp_code_num_command(chunk_size):
+    """Fill employees.emp_code_num for rows created before the column existed."""
+    updated = upgrades.backfill_emp_code_num(chunk_size)
+    click.echo(f"Updated {updated} employee(s).")
+ 
+ 
+# ---------------- CLI: flask admin import-employees ----------------
+@admin_bp.cli.command("import-employees")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", type=int, default=None, help="Rows per batch (default CSV_IMPORT_BATCH_SIZE).")
+def import_employees_command(path, batch_size):
+    """Import employees, salary and bank details from a CSV file."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        report = employee_bulk.import_csv(f, batch_size)
+ 
+    for error in report["errors"]:
+        click.echo(f"line {error['line']} ({error['work_email']}): {error['error']}")
+    click.echo(f"{report['rows']} row(s), {report['created']} created, {len(report['errors'])} error(s).")
@@ -1,7 +1,10 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
 from models.models import Employee, User
 from models.db import db
 from functools import wraps
+from datetime import datetime, timezone
+from sqlalchemy.orm import joinedload
+from utils import change_feed, employee_bulk, sequences
 
 api_emp = Blueprint("api_emp", __name__, url_prefix="/api")
 
@@ -46,6 +49,7 @@ def serialize_employee(emp):
         "dateOfJoining": str(emp.date_of_joining) if emp.date_of_joining else None,
         "status": emp.status,
         "managerEmpId": emp.manager_emp_id,
+        "updatedAt": emp.updated_at.isoformat() if emp.updated_at else None,
         "user": {
             "id": emp.user.id,
             "email": emp.user.email,
@@ -58,16 +62,81 @@ def serialize_employee(emp):
 #  1) GET ALL EMPLOYEES
 # =============================
 
+# Query params (all optional):
+#   status, department   exact-match filters
+#   updatedSince         ISO date/datetime; rows with updated_at >= it
+#   limit, cursor        keyset pagination on employee id; the response
+#                        carries nextCursor (null on the last page)
+# Without limit/cursor the full list is streamed in the old
+# {"total", "data"} shape.
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH = 500
+
+
+def _parse_since(value):
+    value = value.strip()
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    since = datetime.fromisoformat(value)
+    # updated_at is stored as naive UTC
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+def _employee_filters(args):
+    filters = []
+    if args.get("status"):
+        filters.append(Employee.status == args["status"])
+    if args.get("department"):
+        filters.append(Employee.department == args["department"])
+    if args.get("updatedSince"):
+        filters.append(Employee.updated_at >= _parse_since(args["updatedSince"]))
+    return filters
+
+
 @api_emp.route("/employees", methods=["GET"])
 @basic_auth_required
 def api_get_all_employees():
-    employees = Employee.query.all()
-    data = [serialize_employee(e) for e in employees]
-
-    return jsonify({
-        "total": len(data),
-        "data": data
-    }), 200
+    try:
+        filters = _employee_filters(request.args)
+        limit = request.args.get("limit", type=int)
+        cursor = request.args.get("cursor")
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "Invalid updatedSince or cursor"}), 400
+
+    server_time = datetime.utcnow().isoformat()
+    base = Employee.query.options(joinedload(Employee.user)).filter(*filters)
+
+    # ---------- Page mode ----------
+    if limit is not None or cursor is not None:
+        limit = min(max(limit or 100, 1), MAX_PAGE_SIZE)
+        if cursor is not None:
+            base = base.filter(Employee.id > cursor)
+        rows = base.order_by(Employee.id).limit(limit + 1).all()
+        page = rows[:limit]
+
+        return jsonify({
+            "data": [serialize_employee(e) for e in page],
+            "count": len(page),
+            "nextCursor": str(page[-1].id) if len(rows) > limit else None,
+            "serverTime": server_time
+        }), 200
+
+    # ---------- Full list, streamed ----------
+    total = db.session.query(db.func.count(Employee.id)).filter(*filters).scalar()
+    dumps = current_app.json.dumps
+
+    def generate():
+        yield '{"total": %d, "serverTime": %s, "data": [' % (total, dumps(server_time))
+        first = True
+        for emp in base.order_by(Employee.id).yield_per(STREAM_BATCH):
+            yield ("" if first else ",") + dumps(serialize_employee(emp))
+            first = False
+        yield "]}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
 
 
 # =============================
@@ -107,19 +176,6 @@ def api_create_employee():
     if missing:
         return jsonify({"error": f"Missing fields: {missing}"}), 400
 
-    # ================================================
-    # AUTO-GENERATE EMP CODE (increment last one)
-    # ================================================
-    last_emp = Employee.query.order_by(Employee.emp_code.desc()).first()
-
-    if last_emp:
-        try:
-            new_emp_code = str(int(last_emp.emp_code) + 1)
-        except:
-            return jsonify({"error": "Invalid empCode format in DB"}), 500
-    else:
-        new_emp_code = "1"  # First employee
-
     # Check email duplicate
     if User.query.filter_by(email=data["email"]).first():
         return jsonify({"error": "Email already exists"}), 400
@@ -133,7 +189,12 @@ def api_create_employee():
     )
     user.set_password("Temp@123")
     db.session.add(user)
-    db.session.commit()
+    db.session.flush()
+
+    # ================================================
+    # AUTO-GENERATE EMP CODE (sequence, same transaction)
+    # ================================================
+    new_emp_code = sequences.allocate_emp_codes(1)[0]
 
     # Create employee record
     emp = Employee(
@@ -160,6 +221,85 @@ def api_create_employee():
         "employee": serialize_employee(emp)
     }), 201
 
+# =============================
+#  3b) BULK CREATE / UPDATE
+# =============================
+# Body: {"employees": [{...same fields as POST /employee, optional empCode}]}
+# Records whose empCode exists are updated (partial), the rest are created.
+# Valid records are written in one transaction; invalid ones are reported
+# per record and skipped.
+DEFAULT_BULK_MAX_RECORDS = 10000
+
+
+@api_emp.route("/employees/bulk", methods=["POST"])
+@basic_auth_required
+def api_bulk_upsert_employees():
+    data = request.get_json(silent=True) or {}
+    records = data.get("employees")
+
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "employees must be a non-empty list"}), 400
+
+    max_records = current_app.config.get("BULK_EMPLOYEE_MAX_RECORDS", DEFAULT_BULK_MAX_RECORDS)
+    if len(records) > max_records:
+        return jsonify({"error": f"At most {max_records} records per request"}), 413
+
+    try:
+        results = employee_bulk.bulk_upsert(records)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Bulk employee upsert failed")
+        return jsonify({"error": "Bulk upsert failed, nothing was saved"}), 500
+
+    summary = {"created": 0, "updated": 0, "error": 0}
+    for r in results:
+        summary[r["result"]] += 1
+
+    return jsonify({"summary": summary, "results": results}), 200
+
+
+# =============================
+#  3c) BULK STATUS CHANGE
+# =============================
+# Body: {"empCodes": [...], "action": "enable" | "disable" | "terminate"}
+# disable / terminate also clock out any open attendance session.
+@api_emp.route("/employees/status", methods=["POST"])
+@basic_auth_required
+def api_bulk_status():
+    data = request.get_json(silent=True) or {}
+    codes = data.get("empCodes")
+    action = data.get("action")
+
+    if action not in employee_bulk.STATUS_ACTIONS:
+        return jsonify({"error": f"action must be one of {sorted(employee_bulk.STATUS_ACTIONS)}"}), 400
+    if not isinstance(codes, list) or not codes:
+        return jsonify({"error": "empCodes must be a non-empty list"}), 400
+
+    max_records = current_app.config.get("BULK_EMPLOYEE_MAX_RECORDS", DEFAULT_BULK_MAX_RECORDS)
+    if len(codes) > max_records:
+        return jsonify({"error": f"At most {max_records} codes per request"}), 413
+
+    try:
+        report = employee_bulk.bulk_set_status(codes, action)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Bulk status change failed")
+        return jsonify({"error": "Bulk status change failed, nothing was saved"}), 500
+
+    summary = {"updated": 0, "unchanged": 0, "not_found": 0}
+    for r in report["results"]:
+        summary[r["result"]] += 1
+
+    return jsonify({
+        "status": employee_bulk.STATUS_ACTIONS[action],
+        "summary": summary,
+        "closedSessions": report["closedSessions"],
+        "results": report["results"]
+    }), 200
+
+
 # =============================
 #  4) DELETE EMPLOYEE BY empCode
 # =============================
@@ -226,3 +366,47 @@ def api_disable_employee(empCode):
         "message": "Employee disabled successfully",
         "employee": serialize_employee(emp)
     }), 200
+
+
+# =============================
+#  7) CHANGE FEED
+# =============================
+# GET /api/changes?cursor=<last id seen>&limit=
+# Events oldest first; keep polling with nextCursor. Without a cursor the
+# response is empty and nextCursor is the end of the settled feed (call
+# it before a full GET /api/employees sync; events younger than the settle
+# window come through the feed again afterwards).
+DEFAULT_CHANGE_FEED_SETTLE_SECONDS = 5
+
+
+@api_emp.route("/changes", methods=["GET"])
+@basic_auth_required
+def api_changes():
+    cursor = request.args.get("cursor")
+    try:
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    settle = current_app.config.get("CHANGE_FEED_SETTLE_SECONDS", DEFAULT_CHANGE_FEED_SETTLE_SECONDS)
+    if cursor is None:
+        return jsonify({"data": [], "nextCursor": str(change_feed.latest_cursor(settle)), "hasMore": False}), 200
+
+    limit = min(max(request.args.get("limit", 100, type=int), 1), MAX_PAGE_SIZE)
+    events = change_feed.read_changes(cursor, limit + 1, settle)
+    page = events[:limit]
+
+    return jsonify({
+        "data": [
+            {
+                "id": str(e.id),
+                "empCode": e.emp_code,
+                "type": e.event_type,
+                "fields": e.fields.split(",") if e.fields else [],
+                "at": e.created_at.isoformat()
+            }
+            for e in page
+        ],
+        "nextCursor": str(page[-1].id if page else cursor),
+        "hasMore": len(events) > limit
+    }), 200
@@ -1,10 +1,10 @@
 # routes/employee/attendance_employee.py
  
-from flask import Blueprint, render_template, session, redirect, flash, url_for, jsonify
-from models.models import Employee
+from flask import Blueprint, render_template, redirect, flash, url_for, jsonify
 from models.attendance import Attendance, IST
 from models.db import db
 from datetime import datetime, date
+from auth.identity import current_employee
  
 employee_attendance_bp = Blueprint(
     "employee_attendance_bp",
@@ -13,16 +13,6 @@ employee_attendance_bp = Blueprint(
 )
  
  
-# --------------------------------------------------
-# Helper: fetch logged-in employee
-# --------------------------------------------------
-def current_employee():
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-    return Employee.query.filter_by(user_id=user_id).first()
- 
- 
 # --------------------------------------------------
 # Attendance UI Page (HTML)
 # --------------------------------------------------
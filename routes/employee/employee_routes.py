@@ -1,20 +1,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from models.db import db
-from models.models import Employee, User, Leave
+from models.models import User, Leave
 from models.attendance import Attendance, IST
 from datetime import datetime, date
 from functools import wraps
 import uuid
+from auth.identity import current_employee  # request-scoped, one joined query
 
 employee_bp = Blueprint("employee", __name__, url_prefix="/employee")
 
-# ------------------------ Helper: Get logged-in employee ------------------------
-def current_employee():
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-    return Employee.query.filter_by(user_id=user_id).first()
-
 # ------------------------ Login Required Decorator ------------------------
 def login_required(f):
     @wraps(f)
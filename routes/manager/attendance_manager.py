@@ -1,8 +1,9 @@
-from flask import Blueprint, render_template, session, redirect, jsonify
-from models.models import Employee
+from flask import Blueprint, render_template, redirect, jsonify
 from models.attendance import Attendance, IST
 from models.db import db
 from datetime import datetime, date
+# Any employee profile, as before (no role check)
+from auth.identity import current_employee as current_manager
 
 manager_attendance_bp = Blueprint(
     "manager_attendance_bp",
@@ -10,16 +11,6 @@ manager_attendance_bp = Blueprint(
     url_prefix="/manager/attendance"
 )
 
-# --------------------------------------------------
-# Helper: fetch logged-in manager
-# --------------------------------------------------
-def current_manager():
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-    return Employee.query.filter_by(user_id=user_id).first()
-
-
 # --------------------------------------------------
 # Attendance UI Page (HTML)
 # --------------------------------------------------
@@ -1,57 +1,28 @@
-from flask import Blueprint, render_template, session, redirect, url_for, request, flash
-from models.models import Employee, Leave, User, Holiday, db,Leavee,LeaveApprovalConfig
+from flask import Blueprint, render_template, redirect, url_for, request, flash
+from models.models import Leave, User, db,Leavee
 from datetime import datetime
 
-from flask import Blueprint, render_template, session, redirect, flash, url_for, jsonify
-from models.models import Employee
+from flask import Blueprint, render_template, redirect, flash, url_for, jsonify
 from models.attendance import Attendance, IST
 from models.db import db
 from datetime import datetime, date
+from utils import leave_workflow, approver_inbox, ref_cache, team_calendar
+from utils.leave_workflow import LeaveRequestError
+from auth.identity import current_employee
 manager_lbp = Blueprint(
     "manager_leaves",
     __name__,
     url_prefix="/manager/leaves"
 )
-def current_employee():
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-    return Employee.query.filter_by(user_id=user_id).first()
 @manager_lbp.route("/leave-management")
 def leave_management():
     emp = current_employee()
     if not emp:
         return redirect(url_for("auth.login"))
 
-    holidays = Holiday.query.all()
-    config = LeaveApprovalConfig.query.first()
-
-    show_approvals_tab = False
-
-    if config:
-
-        # ---------------------------------------------------------
-        # CASE 1: Fixed Level 1 Approver (NOT using manager)
-        # ---------------------------------------------------------
-        if not config.use_manager_l1 and config.level1_approver_id:
-            if int(config.level1_approver_id) == emp.user_id:
-                show_approvals_tab = True
-
-        # ---------------------------------------------------------
-        # CASE 2: Fixed Level 2 Approver
-        # ---------------------------------------------------------
-        if config.level2_approver_id:
-            if int(config.level2_approver_id) == emp.user_id:
-                show_approvals_tab = True
-
-        # ---------------------------------------------------------
-        # CASE 3: MANAGER-based L1 approver
-        # ---------------------------------------------------------
-        if config.use_manager_l1:
-            # If this logged-in employee manages others
-            managed_emps = Employee.query.filter_by(manager_emp_id=emp.id).all()
-            if managed_emps:
-                show_approvals_tab = True
+    holidays = ref_cache.holidays()
+    # Cached per user; dropped when the approval config or a reporting line changes
+    show_approvals_tab = approver_inbox.is_approver(emp)
 
     return render_template(
         "manager/leave_management.html",
@@ -69,53 +40,21 @@ def submit_leave():
 
     start = datetime.strptime(request.form['start_date'], "%Y-%m-%d").date()
     end = datetime.strptime(request.form['end_date'], "%Y-%m-%d").date()
-    total_days = (end - start).days + 1
-
-    config = LeaveApprovalConfig.query.first()
-
-    # -----------------------------------------
-    # 🔥 LEVEL 1 APPROVER LOGIC (UPDATED)
-    # -----------------------------------------
-    if config.use_manager_l1:
-        # employee.manager is another Employee object
-        if emp.manager:
-            level1_approver_user_id = emp.manager.user_id
-        else:
-            flash("Manager not configured for your profile!", "danger")
-            return redirect(url_for("employee_leaves.leave_management"))
-    else:
-        # Normal fixed user_id
-        level1_approver_user_id = (
-            int(config.level1_approver_id)
-            if config.level1_approver_id else None
-        )
-
-    # -----------------------------------------
-    # LEVEL 2 APPROVER (same as before)
-    # -----------------------------------------
-    level2_approver_user_id = (
-        int(config.level2_approver_id)
-        if config.level2_approver_id else None
-    )
 
-    # -----------------------------------------
-    # CREATE LEAVE REQUEST
-    # -----------------------------------------
-    leave = Leavee(
-        emp_code=emp.emp_code,
-        start_date=start,
-        end_date=end,
-        total_days=total_days,
-        reason=request.form['reason'],
-        employee_name=request.form['employee_name'],
-        leave_type=request.form['leave_type'],
-        status="PENDING_L1",
-        level1_approver_id=level1_approver_user_id,
-        level2_approver_id=level2_approver_user_id,
-        current_approver_id=level1_approver_user_id
-    )
+    try:
+        leave_workflow.submit_leave_request(
+            emp,
+            start,
+            end,
+            leave_type=request.form['leave_type'],
+            reason=request.form['reason'],
+            employee_name=request.form['employee_name']
+        )
+    except LeaveRequestError as e:
+        db.session.rollback()
+        flash(str(e), "danger")
+        return redirect(url_for("manager_leaves.leave_management"))
 
-    db.session.add(leave)
     db.session.commit()
 
     flash("Leave request submitted!", "success")
@@ -139,41 +78,40 @@ def my_requests():
         }
         for l in leaves
     ])
+@manager_lbp.route("/leave/pending-count")
+def pending_count():
+    emp = current_employee()
+    if not emp:
+        return jsonify({"error": "Not logged in"}), 401
+
+    return jsonify(approver_inbox.pending_counts(emp.user_id))
+
+
+@manager_lbp.route("/leave/team-calendar")
+def team_leave_calendar():
+    emp = current_employee()
+    if not emp:
+        return jsonify({"error": "Not logged in"}), 401
+
+    try:
+        start, end = team_calendar.parse_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Direct reports of the logged-in employee
+    return jsonify(team_calendar.team_calendar(start, end, manager_emp_id=emp.id))
+
+
 @manager_lbp.route("/leave/my-approvals")
 def my_approvals():
     emp = current_employee()
 
-    # Fetch approval config
-    config = LeaveApprovalConfig.query.first()
-    level1 = config.level1_approver_id
-    level2 = config.level2_approver_id
-
-    all_pending = Leavee.query.filter_by(current_approver_id=emp.user_id).all()
-
-    final_list = []
-
-    for l in all_pending:
-
-        # --------------------------
-        # RULE: SKIP SELF-APPROVAL
-        # If employee is Level-1 approver AND leave belongs to him → skip
-        # --------------------------
-        if emp.user_id == level1 and l.emp_code == emp.emp_code:
-            # Auto-route to Level2 instead of showing in L1 approvals
-            l.current_approver_id = level2
-            l.status = "PENDING_L2"
-            db.session.commit()
-            continue  # do NOT show in the list
-
-        # If employee is Level2 approver AND request belongs to him → auto approve
-        if emp.user_id == level2 and l.emp_code == emp.emp_code:
-            l.status = "APPROVED"
-            l.current_approver_id = None
-            db.session.commit()
-            continue  # do NOT show in approvals
-
-        # Normal case → show in list
-        final_list.append({
+    # Self-submitted leaves are routed at submit time, so this is a plain
+    # lookup on the indexed current_approver_id column.
+    pending = Leavee.query.filter_by(current_approver_id=emp.user_id).all()
+
+    final_list = [
+        {
             "id": l.id,
             "emp_code": l.emp_code,
             "employee_name":l.employee_name,
@@ -185,47 +123,63 @@ def my_approvals():
             "leave_type":l.leave_type,
             "level1_decision_date": l.level1_decision_date,
             "level2_decision_date": l.level2_decision_date,
-        })
+        }
+        for l in pending
+    ]
 
     return jsonify(final_list)
 
 @manager_lbp.route("/leave/approve/<int:leave_id>", methods=["POST"])
 def approve_leave(leave_id):
     emp = current_employee()
-    leave = Leavee.query.get_or_404(leave_id)
+    # Locked: a concurrent decision (or double click) waits here, then sees
+    # the leave has moved on and fails the approver check
+    leave = Leavee.query.filter_by(id=leave_id).with_for_update().populate_existing().first_or_404()
 
     if leave.current_approver_id != emp.user_id:
         return jsonify({"error": "Not authorized"}), 403
 
-    if leave.status == "PENDING_L1":
-        leave.status = "PENDING_L2"
-        leave.level1_decision_date = datetime.now()
-        leave.current_approver_id = leave.level2_approver_id
-
-    elif leave.status == "PENDING_L2":
-        leave.status = "APPROVED"
-        leave.level2_decision_date = datetime.now()
-        leave.current_approver_id = None
-
+    leave_workflow.approve(leave)
     db.session.commit()
     return jsonify({"success": True})
 @manager_lbp.route("/leave/reject/<int:leave_id>", methods=["POST"])
 def reject_leave(leave_id):
     emp = current_employee()
-    leave = Leavee.query.get_or_404(leave_id)
+    leave = Leavee.query.filter_by(id=leave_id).with_for_update().populate_existing().first_or_404()
 
     if leave.current_approver_id != emp.user_id:
         return jsonify({"error": "Not authorized"}), 403
 
-    if leave.status == "PENDING_L1":
-        leave.status = "REJECTED_L1"
-        leave.level1_decision_date = datetime.now()
+    leave_workflow.reject(leave)
+    db.session.commit()
+
+    return jsonify({"success": True})
 
-    elif leave.status == "PENDING_L2":
-        leave.status = "REJECTED_L2"
-        leave.level2_decision_date = datetime.now()
 
-    leave.current_approver_id = None
+# ---------------- BULK APPROVE / REJECT ----------------
+# Body: {"ids": [1, 2, 3]}  →  {"results": [{"id", "result", "status"}, ...]}
+@manager_lbp.route("/leave/bulk-approve", methods=["POST"])
+def bulk_approve_leaves():
+    return _bulk_decide(approve=True)
+
+
+@manager_lbp.route("/leave/bulk-reject", methods=["POST"])
+def bulk_reject_leaves():
+    return _bulk_decide(approve=False)
+
+
+def _bulk_decide(approve):
+    emp = current_employee()
+    if not emp:
+        return jsonify({"error": "Not logged in"}), 401
+
+    ids = (request.get_json(silent=True) or {}).get("ids")
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        return jsonify({"error": "ids must be a list of leave ids"}), 400
+    if len(ids) > leave_workflow.MAX_BULK_DECISIONS:
+        return jsonify({"error": f"At most {leave_workflow.MAX_BULK_DECISIONS} leaves per request"}), 413
+
+    results = leave_workflow.bulk_decide(emp.user_id, ids, approve=approve)
     db.session.commit()
 
-    return jsonify({"success": True})
+    return jsonify({"results": results})
@@ -3,17 +3,15 @@ from models.db import db
 from models.models import (
     EmployeeSalary,
     EmployeeAccount,
-    PayrollRun,
-    Leavee,
-    Attendance,
-    Holiday
+    PayrollRun
 )
-from sqlalchemy import extract, func
 import calendar
 from io import BytesIO
 import pdfkit
 from routes.employee.employee_routes import current_employee, login_required
 import inflect
+from utils.pdf_render import render_slot, RenderQueueFull
+from utils.payroll import employee_month
 config = pdfkit.configuration(wkhtmltopdf='/usr/bin/wkhtmltopdf')
 manager_payroll_bp = Blueprint(
     "manager_payroll",
@@ -28,25 +26,6 @@ def number_to_words(n):
     p = inflect.engine()
     return p.number_to_words(n, andword="") + " rupees"
 
-# -------------------------------
-# Count Sundays
-# -------------------------------
-def count_sundays(year, month):
-    cal = calendar.Calendar()
-    return sum(
-        1 for day in cal.itermonthdates(year, month)
-        if day.month == month and day.weekday() == 6
-    )
-
-# -------------------------------
-# Count holidays
-# -------------------------------
-def count_holidays(year, month):
-    return Holiday.query.filter(
-        extract("month", Holiday.date) == month,
-        extract("year", Holiday.date) == year
-    ).count()
-
 # -------------------------------
 # Payslip page
 # -------------------------------
@@ -92,70 +71,17 @@ def download_payslip():
         return redirect(url_for("manager_payroll.payslip_page"))
 
     # -------------------------------
-    # Working days calculation
-    # -------------------------------
-    total_days = calendar.monthrange(year, month)[1]
-    sundays = count_sundays(year, month)
-    holidays = count_holidays(year, month)
-
-    total_working_days = total_days - sundays - holidays
-
-    # -------------------------------
-    # Attendance (>= 1 hour)
+    # Working days / attendance / leaves (attendance >= 1 second)
     # -------------------------------
-    attendance_days = db.session.query(
-        func.count(func.distinct(Attendance.date))
-    ).filter(
-        Attendance.user_id == emp.user_id,
-        extract("month", Attendance.date) == month,
-        extract("year", Attendance.date) == year,
-        Attendance.duration_seconds >= 1
-    ).scalar() or 0
+    row = employee_month(emp, salary, year, month, min_attendance_seconds=1)
 
-    # -------------------------------
-    # Paid leaves (CL + SL)
-    # -------------------------------
-    paid_leave_days = db.session.query(
-        func.coalesce(func.sum(Leavee.total_days), 0)
-    ).filter(
-        Leavee.emp_code == emp.emp_code,
-        Leavee.leave_type.in_(["Casual Leave", "Sick Leave"]),
-        Leavee.status == "Approved",
-        extract("month", Leavee.start_date) == month,
-        extract("year", Leavee.start_date) == year
-    ).scalar() or 0
-
-    present_days = int(attendance_days + paid_leave_days)
-
-    # -------------------------------
-    # LWP (Absent)
-    # -------------------------------
-    lwp_days = db.session.query(
-        func.coalesce(func.sum(Leavee.total_days), 0)
-    ).filter(
-        Leavee.emp_code == emp.emp_code,
-        Leavee.leave_type == "Leave Without Pay",
-        Leavee.status == "Approved",
-        extract("month", Leavee.start_date) == month,
-        extract("year", Leavee.start_date) == year
-    ).scalar() or 0
-
-    lwp_days = int(lwp_days)
-    # -------------------------------
-# Absent days
-# -------------------------------
-    absent_days = total_working_days - present_days - lwp_days
-    if absent_days < 0:
-        absent_days = 0  # just in case
-
-
-    # -------------------------------
-    # Salary calculation (based on paid days)
-    # -------------------------------
-    monthly_salary = float(salary.gross_salary)
-    salary_per_day = round(monthly_salary / total_working_days, 2)
-    net_salary = round(present_days * salary_per_day, 2)
-    lwp_deduction = round(monthly_salary - net_salary, 2)
+    total_working_days = row["total_working_days"]
+    present_days = row["present_days"]
+    lwp_days = row["lwp_days"]
+    absent_days = row["absent_days"]
+    monthly_salary = row["gross_salary"]
+    net_salary = row["net_salary"]
+    lwp_deduction = row["lwp_deduction"]
 
     # -------------------------------
     # Earnings breakdown
@@ -213,7 +139,16 @@ def download_payslip():
         "enable-local-file-access": None
     }
 
-    pdf_bytes = pdfkit.from_string(rendered_html,False,options=pdf_options,configuration=config)
+    # Renders are gated so a payday spike can't fork unlimited wkhtmltopdf
+    try:
+        with render_slot():
+            pdf_bytes = pdfkit.from_string(rendered_html,False,options=pdf_options,configuration=config)
+    except RenderQueueFull as e:
+        return (
+            "Payslip generation is busy. Please retry shortly.",
+            503,
+            {"Retry-After": str(e.retry_after)}
+        )
 
     return send_file(
         BytesIO(pdf_bytes),
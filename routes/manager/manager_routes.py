@@ -2,32 +2,13 @@
 
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from models.db import db
-from models.models import Employee, User, Role
+from models.models import Employee, User
 from functools import wraps
+from auth.identity import current_manager  # Employee if the user's role is manager
 
 manager_bp = Blueprint("manager", __name__, url_prefix="/manager")
 
 
-# ---------------- Helper Function ----------------
-def current_manager():
-    """
-    Returns the Employee object if the logged-in user is a manager.
-    """
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-
-    # Join Employee -> User -> Role to ensure the user is a manager
-    mgr = (
-        Employee.query
-        .join(User)
-        .join(Role)
-        .filter(Employee.user_id == user_id, Role.name == "manager")
-        .first()
-    )
-    return mgr
-
-
 # ---------------- Login Required Decorator ----------------
 def login_required(f):
     @wraps(f)
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, session, redirect, flash, url_for
-from models.models import User
 from models.db import db
+from utils import ref_cache
+from auth.identity import current_user
 
 settings_bp = Blueprint("settings", __name__, url_prefix="/settings")
 
@@ -10,10 +11,10 @@ def change_password():
     if not user_id:
         return redirect(url_for("auth.login"))
 
-    user = User.query.get(user_id)
+    user = current_user()
 
     # Decide base template dynamically
-    role = user.role.name.lower()
+    role = ref_cache.role_name(user.role_id)
     if role == "admin":
         base_template = "admin/admin_base.html"
     elif role=="manager":
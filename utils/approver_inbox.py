@@ -0,0 +1,79 @@
+import threading
+
+from sqlalchemy import func
+
+from models.db import db
+from models.models import Employee, Leavee
+from utils import ref_cache
+
+# -------------------------------
+# Approver flag + pending counters (per process)
+# -------------------------------
+# is_approver(emp): does this user ever see the approvals tab? Cached and
+# tied to the approval_config and reporting_lines versions in ref_cache,
+# so changes made by any worker reset it.
+# pending_counts(user_id): how many requests wait on this approver? Not
+# cached: one range read on the (current_approver_id, status) index, and
+# a shared version would make every leave write contend on one row.
+
+PENDING_STATUSES = ("PENDING_L1", "PENDING_L2")
+
+_approver_flags = {}     # user_id -> bool
+_flags_versions = None   # (approval_config, reporting_lines) the flags were computed at
+_lock = threading.Lock()
+
+
+def is_approver(emp):
+    global _flags_versions
+    current = (ref_cache.version(ref_cache.APPROVAL_CONFIG), ref_cache.version(ref_cache.REPORTING_LINES))
+    if current != _flags_versions:
+        with _lock:
+            _approver_flags.clear()
+            _flags_versions = current
+
+    flag = _approver_flags.get(emp.user_id)
+    if flag is None:
+        flag = _compute_is_approver(emp)
+        with _lock:
+            # Another request may have moved to newer versions meanwhile;
+            # don't file a flag computed under the old ones with them
+            if _flags_versions == current:
+                _approver_flags[emp.user_id] = flag
+    return flag
+
+
+def _compute_is_approver(emp):
+    config = ref_cache.approval_config()
+    if not config:
+        return False
+
+    # Fixed Level 1 approver (not using manager)
+    if not config.use_manager_l1 and config.level1_approver_id:
+        if int(config.level1_approver_id) == emp.user_id:
+            return True
+
+    # Fixed Level 2 approver
+    if config.level2_approver_id:
+        if int(config.level2_approver_id) == emp.user_id:
+            return True
+
+    # Manager-based L1: does anyone report to this employee?
+    if config.use_manager_l1:
+        return db.session.query(
+            Employee.query.filter_by(manager_emp_id=emp.id).exists()
+        ).scalar()
+
+    return False
+
+
+def pending_counts(user_id):
+    # Served by the (current_approver_id, status) index
+    rows = db.session.query(Leavee.status, func.count(Leavee.id)).filter(
+        Leavee.current_approver_id == user_id,
+        Leavee.status.in_(PENDING_STATUSES)
+    ).group_by(Leavee.status).all()
+
+    counts = {status: 0 for status in PENDING_STATUSES}
+    counts.update({status: n for status, n in rows})
+    counts["total"] = sum(n for _, n in rows)
+    return counts
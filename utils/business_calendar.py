@@ -0,0 +1,128 @@
+import calendar
+import threading
+from datetime import date, timedelta
+
+from models.models import Holiday
+from utils import ref_cache
+
+# -------------------------------
+# Per-year working-day tables
+# -------------------------------
+# A day is a working day unless it is a Sunday or a listed Holiday.
+# Each year is loaded with a single Holiday query and turned into a prefix
+# sum, so "working days between A and B" is a subtraction. Tables are
+# reloaded when the holidays version in ref_cache moves.
+
+SUNDAY = 6
+
+_tables = {}
+_lock = threading.Lock()
+
+
+class _YearTable:
+    def __init__(self, year, holiday_dates, version=0):
+        self.year = year
+        self.version = version
+        self.jan1 = date(year, 1, 1)
+        days = 366 if calendar.isleap(year) else 365
+
+        # prefix[i] = working days in the first i days of the year
+        self.prefix = [0] * (days + 1)
+        self.months = {}
+
+        for i in range(days):
+            d = self.jan1 + timedelta(days=i)
+            is_sunday = d.weekday() == SUNDAY
+            is_holiday = d in holiday_dates and not is_sunday
+            working = not (is_sunday or is_holiday)
+            self.prefix[i + 1] = self.prefix[i] + (1 if working else 0)
+
+            m = self.months.setdefault(d.month, {
+                "days_in_month": 0,
+                "sundays": 0,
+                "holidays": 0,
+                "working_days": 0
+            })
+            m["days_in_month"] += 1
+            m["sundays"] += is_sunday
+            m["holidays"] += is_holiday
+            m["working_days"] += working
+
+    def index(self, d):
+        return (d - self.jan1).days
+
+    def is_working(self, d):
+        i = self.index(d)
+        return self.prefix[i + 1] > self.prefix[i]
+
+    def between(self, start, end):
+        return self.prefix[self.index(end) + 1] - self.prefix[self.index(start)]
+
+    @property
+    def total(self):
+        return self.prefix[-1]
+
+
+def _load_year(year, version):
+    rows = Holiday.query.with_entities(Holiday.date).filter(
+        Holiday.date >= date(year, 1, 1),
+        Holiday.date <= date(year, 12, 31)
+    ).all()
+    return _YearTable(year, {r.date for r in rows}, version)
+
+
+def _table(year):
+    current = ref_cache.version(ref_cache.HOLIDAYS)
+    table = _tables.get(year)
+    if table is None or table.version < current:
+        with _lock:
+            # Concurrent first requests wait here and reuse the first build
+            table = _tables.get(year)
+            if table is None or table.version < current:
+                table = _tables[year] = _load_year(year, current)
+    return table
+
+
+# -------------------------------
+# Public API
+# -------------------------------
+def month_summary(year, month):
+    """
+    Returns {"days_in_month", "sundays", "holidays", "working_days"}.
+    Holidays that fall on a Sunday are only counted as Sundays.
+    """
+    return dict(_table(year).months[month])
+
+
+def working_days_in_month(year, month):
+    return _table(year).months[month]["working_days"]
+
+
+def working_days_between(start, end):
+    """
+    Working days from start to end, both inclusive. 0 if end < start.
+    """
+    if end < start:
+        return 0
+
+    if start.year == end.year:
+        return _table(start.year).between(start, end)
+
+    total = _table(start.year).between(start, date(start.year, 12, 31))
+    for year in range(start.year + 1, end.year):
+        total += _table(year).total
+    total += _table(end.year).between(date(end.year, 1, 1), end)
+    return total
+
+
+def working_dates_between(start, end):
+    """
+    The working days from start to end (inclusive), as a list of dates.
+    """
+    dates = []
+    d = start
+    while d <= end:
+        if _table(d.year).is_working(d):
+            dates.append(d)
+        d += timedelta(days=1)
+    return dates
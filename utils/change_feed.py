@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from models.db import db
+from models.models import Employee, User, EmployeeChangeEvent
+
+# -------------------------------
+# Employee change feed (transactional outbox)
+# -------------------------------
+# ORM writes to employees / users append events from an after_flush
+# listener, on the same connection, so an event exists if and only if its
+# change committed. Set-based writes (bulk endpoints) call record() with
+# the codes they touched. Consumers page through GET /api/changes by id.
+
+CREATED = "CREATED"
+UPDATED = "UPDATED"
+ENABLED = "ENABLED"
+DISABLED = "DISABLED"
+DELETED = "DELETED"
+
+# Audit columns, not identity changes
+_IGNORED_FIELDS = {
+    "updated_at", "created_at", "last_login_at", "password_hash", "must_change_password", "emp_code_num"
+}
+
+DEFAULT_SETTLE_SECONDS = 5
+
+
+def record(session, emp_codes, event_type, fields=None):
+    """
+    Appends one event per emp_code in the session's transaction.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {"emp_code": str(code), "event_type": event_type,
+         "fields": ",".join(sorted(fields)) if fields else None, "created_at": now}
+        for code in emp_codes if code is not None
+    ]
+    if rows:
+        session.connection().execute(insert(EmployeeChangeEvent), rows)
+
+
+def _changed_fields(obj):
+    state = db.inspect(obj)
+    return {
+        attr.key for attr in state.mapper.column_attrs
+        if attr.key not in _IGNORED_FIELDS and state.attrs[attr.key].history.has_changes()
+    }
+
+
+def _status_event(active):
+    return ENABLED if active else DISABLED
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    events = {}         # (emp_code, event_type) -> changed fields
+    user_changes = {}   # user id -> (event_type, fields)
+
+    def add(code, event_type, fields=()):
+        events.setdefault((code, event_type), set()).update(fields)
+
+    for obj in session.new:
+        if isinstance(obj, Employee):
+            add(obj.emp_code, CREATED)
+
+    for obj in session.deleted:
+        if isinstance(obj, Employee):
+            add(obj.emp_code, DELETED)
+
+    for obj in session.dirty:
+        if isinstance(obj, Employee):
+            fields = _changed_fields(obj)
+            if "status" in fields:
+                add(obj.emp_code, _status_event(obj.status == "Active"))
+                fields.discard("status")
+            if fields:
+                add(obj.emp_code, UPDATED, fields)
+
+        elif isinstance(obj, User) and obj not in session.deleted:
+            fields = _changed_fields(obj)
+            if "is_active" in fields:
+                user_changes.setdefault(obj.id, []).append((_status_event(obj.is_active), ()))
+                fields.discard("is_active")
+            if fields:
+                user_changes.setdefault(obj.id, []).append((UPDATED, {"user." + f for f in fields}))
+
+    if user_changes:
+        codes = session.connection().execute(
+            select(Employee.user_id, Employee.emp_code).where(Employee.user_id.in_(list(user_changes)))
+        )
+        for user_id, code in codes:
+            for event_type, fields in user_changes[user_id]:
+                add(code, event_type, fields)
+
+        # The employee payload embeds the user, so ?updatedSince= must see
+        # user-only changes too
+        employees = Employee.__table__
+        session.connection().execute(
+            update(employees).where(employees.c.user_id.in_(list(user_changes))).values(updated_at=datetime.utcnow())
+        )
+
+    # A created / deleted employee needs no further events from this flush
+    for code, event_type in list(events):
+        if event_type not in (CREATED, DELETED) and (
+                (code, CREATED) in events or (code, DELETED) in events):
+            del events[(code, event_type)]
+
+    # employee.status and user.is_active often land in separate (auto)flushes
+    # of one transaction; report the lifecycle event once
+    seen = session.info.setdefault("change_feed_seen", set())
+    for (code, event_type), fields in events.items():
+        if event_type != UPDATED:
+            if (code, event_type) in seen:
+                continue
+            seen.add((code, event_type))
+        record(session, [code], event_type, fields)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reset_seen(session):
+    session.info.pop("change_feed_seen", None)
+
+
+# -------------------------------
+# Reading
+# -------------------------------
+def read_changes(cursor=0, limit=100, settle_seconds=DEFAULT_SETTLE_SECONDS):
+    """
+    Events with id > cursor, oldest first. Events younger than
+    settle_seconds are held back: ids are assigned at insert time, so a
+    slower transaction can commit a lower id after a higher one has
+    already been read.
+
+    This assumes no transaction commits more than settle_seconds after
+    inserting its first event (created_at is the insert time, not the
+    commit time). The writers here commit right after their writes: single
+    edits, bulk upserts, and CSV imports, which hash passwords before
+    opening each batch's savepoint. A writer that holds a transaction
+    open longer needs a larger CHANGE_FEED_SETTLE_SECONDS, or its events
+    can land behind a consumer's cursor.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    return EmployeeChangeEvent.query.filter(
+        EmployeeChangeEvent.id > cursor,
+        EmployeeChangeEvent.created_at <= cutoff
+    ).order_by(EmployeeChangeEvent.id).limit(limit).all()
+
+
+def latest_cursor(settle_seconds=DEFAULT_SETTLE_SECONDS):
+    """
+    End of the settled feed; a new consumer starts here after a full sync.
+    Events still inside the settle window stay ahead of the cursor (a
+    lower id may yet commit among them), so they are delivered again
+    rather than skipped.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    return db.session.query(db.func.max(EmployeeChangeEvent.id)).filter(
+        EmployeeChangeEvent.created_at <= cutoff
+    ).scalar() or 0
@@ -0,0 +1,666 @@
+import csv
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, update, bindparam
+from werkzeug.security import generate_password_hash
+
+from models.db import db
+from models.models import Employee, User, EmployeeSalary, EmployeeAccount, emp_code_number
+from models.attendance import Attendance, IST
+from utils import change_feed, payroll_preview, ref_cache, sequences
+
+# -------------------------------
+# Bulk employee upsert (API)
+# -------------------------------
+# A batch is validated against the database with a handful of set-based
+# lookups (existing codes, emails, managers), then written with
+# executemany INSERTs / UPDATEs in the caller's transaction. Records with
+# an existing empCode are updated; the rest are created with a block of
+# codes from the emp_code sequence and a user account on the temporary
+# password.
+
+TEMP_PASSWORD = "Temp@123"
+EMPLOYEE_ROLE_ID = 3
+LOOKUP_CHUNK = 1000
+
+# API field -> Employee column
+FIELDS = {
+    "firstName": "first_name",
+    "lastName": "last_name",
+    "email": "work_email",
+    "phone": "phone",
+    "department": "department",
+    "jobTitle": "job_title",
+    "address": "address",
+    "dateOfJoining": "date_of_joining",
+    "status": "status",
+    "managerEmpId": "manager_emp_id"
+}
+REQUIRED_FOR_CREATE = ("firstName", "lastName", "email", "dateOfJoining")
+
+
+class BulkRecordError(Exception):
+    pass
+
+
+def _chunks(values, size=LOOKUP_CHUNK):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _lookup(column, values, *key_columns):
+    """
+    {value: key row} for the values that exist, LOOKUP_CHUNK per IN list.
+    """
+    found = {}
+    for chunk in _chunks(values):
+        for row in db.session.query(column, *key_columns).filter(column.in_(chunk)):
+            found[row[0]] = row[1:]
+    return found
+
+
+def _parse(record, creating):
+    if not isinstance(record, dict):
+        raise BulkRecordError("Record must be an object")
+
+    if creating:
+        missing = [f for f in REQUIRED_FOR_CREATE if not record.get(f)]
+        if missing:
+            raise BulkRecordError(f"Missing fields: {missing}")
+    else:
+        # NOT NULL columns can't be cleared by an update either
+        empty = [f for f in REQUIRED_FOR_CREATE if f in record and record[f] in (None, "")]
+        if empty:
+            raise BulkRecordError(f"Fields cannot be empty: {empty}")
+
+    values = {}
+    for api_name, column in FIELDS.items():
+        if api_name in record:
+            if isinstance(record[api_name], (dict, list)):
+                raise BulkRecordError(f"{api_name} must be a single value")
+            values[column] = record[api_name]
+
+    if values.get("date_of_joining"):
+        try:
+            values["date_of_joining"] = datetime.strptime(str(values["date_of_joining"]), "%Y-%m-%d").date()
+        except ValueError:
+            raise BulkRecordError("dateOfJoining must be YYYY-MM-DD")
+
+    if "manager_emp_id" in values and values["manager_emp_id"] in ("", None):
+        values["manager_emp_id"] = None
+    elif "manager_emp_id" in values:
+        try:
+            values["manager_emp_id"] = int(values["manager_emp_id"])
+        except (TypeError, ValueError):
+            raise BulkRecordError("managerEmpId must be an employee id")
+
+    if "work_email" in values:
+        values["work_email"] = str(values["work_email"]).strip().lower()
+    return values
+
+
+def bulk_upsert(records):
+    """
+    Validates and writes a batch (caller commits). Returns one result per
+    input record, in order:
+    {"index", "empCode", "result": "created" | "updated" | "error", "error"?}
+    """
+    results = [None] * len(records)
+    codes = {
+        i: str(r["empCode"]).strip()
+        for i, r in enumerate(records)
+        if isinstance(r, dict) and r.get("empCode") not in (None, "")
+    }
+
+    # ---------- set-based lookups ----------
+    # emp_code -> (employee id, user id, status)
+    existing = _lookup(Employee.emp_code, set(codes.values()), Employee.id, Employee.user_id, Employee.status)
+
+    emails = {
+        str(r["email"]).strip().lower()
+        for r in records if isinstance(r, dict) and r.get("email")
+    }
+    user_emails = {e.lower(): k for e, k in _lookup(User.email, emails, User.id).items()}
+    employee_emails = {e.lower(): k for e, k in _lookup(Employee.work_email, emails, Employee.emp_code).items()}
+
+    manager_ids = set()
+    for r in records:
+        if isinstance(r, dict) and r.get("managerEmpId") not in (None, ""):
+            try:
+                manager_ids.add(int(r["managerEmpId"]))
+            except (TypeError, ValueError):
+                pass
+    known_managers = set(_lookup(Employee.id, manager_ids))
+
+    # ---------- validate ----------
+    creates, updates = [], []
+    seen_emails, seen_codes = set(), set()
+
+    for i, record in enumerate(records):
+        code = codes.get(i)
+        creating = code is None or code not in existing
+        try:
+            values = _parse(record, creating)
+
+            if code is not None:
+                if code in seen_codes:
+                    raise BulkRecordError("Duplicate empCode in batch")
+                seen_codes.add(code)
+
+            email = values.get("work_email")
+            if email:
+                if email in seen_emails:
+                    raise BulkRecordError("Duplicate email in batch")
+                seen_emails.add(email)
+                if creating:
+                    if email in user_emails or email in employee_emails:
+                        raise BulkRecordError("Email already exists")
+                else:
+                    owner_code = employee_emails.get(email)
+                    owner_user = user_emails.get(email)
+                    if (owner_code and owner_code[0] != code) or (owner_user and owner_user[0] != existing[code][1]):
+                        raise BulkRecordError("Email belongs to another employee")
+
+            manager = values.get("manager_emp_id")
+            if manager is not None and manager not in known_managers:
+                raise BulkRecordError(f"Manager {manager} not found")
+
+        except BulkRecordError as e:
+            results[i] = {"index": i, "empCode": code, "result": "error", "error": str(e)}
+            continue
+
+        if creating:
+            creates.append((i, code, values))
+        else:
+            updates.append((i, code, values))
+
+    now = datetime.utcnow()
+
+    # ---------- updates ----------
+    if updates:
+        # updated_at set explicitly: bulk mappings skip onupdate defaults
+        db.session.bulk_update_mappings(Employee, [
+            dict(values, id=existing[code][0], updated_at=now)
+            for _, code, values in updates
+        ])
+        # Login email follows the work email, login access the status (as
+        # in the single enable / disable endpoints)
+        user_rows = []
+        for _, code, values in updates:
+            user_row = {}
+            if "work_email" in values:
+                user_row["email"] = values["work_email"]
+            if "status" in values:
+                user_row["is_active"] = values["status"] == "Active"
+            if user_row and existing[code][1]:
+                user_rows.append(dict(user_row, id=existing[code][1]))
+        db.session.bulk_update_mappings(User, user_rows)
+        for i, code, _ in updates:
+            results[i] = {"index": i, "empCode": code, "result": "updated"}
+
+    # ---------- creates ----------
+    if creates:
+        password_hash = generate_password_hash(TEMP_PASSWORD)   # once per batch
+        db.session.execute(insert(User), [
+            {
+                "email": values["work_email"],
+                "display_name": f"{values['first_name']} {values['last_name']}",
+                "password_hash": password_hash,
+                "role_id": EMPLOYEE_ROLE_ID,
+                "is_active": (values.get("status") or "Active") == "Active",
+                "must_change_password": True,
+                "created_at": now
+            }
+            for _, _, values in creates
+        ])
+        user_ids = {
+            e.lower(): k
+            for e, k in _lookup(User.email, [values["work_email"] for _, _, values in creates], User.id).items()
+        }
+
+        # Explicit new codes push the sequence past them; the rest get one block
+        given = [int(code) for _, code, _ in creates if code is not None and code.isdigit()]
+        if given:
+            sequences.advance_past(sequences.EMP_CODE, max(given))
+        missing = sum(1 for _, code, _ in creates if code is None)
+        new_codes = iter(sequences.allocate_emp_codes(missing) if missing else ())
+
+        rows = []
+        for i, code, values in creates:
+            if code is None:
+                code = next(new_codes)
+            rows.append(dict(
+                values,
+                emp_code=code,
+                emp_code_num=emp_code_number(code),
+                status=values.get("status") or "Active",
+                user_id=user_ids[values["work_email"]][0],
+                created_at=now,
+                updated_at=now
+            ))
+            results[i] = {"index": i, "empCode": code, "result": "created"}
+        db.session.execute(insert(Employee), rows)
+
+    # Set-based writes bypass the flush listeners
+    if any("manager_emp_id" in values for _, _, values in creates + updates):
+        ref_cache.bump(ref_cache.REPORTING_LINES)
+    payroll_preview.mark_on_commit(db.session, emp_codes=[code for _, code, _ in updates])
+    _record_changes(creates, updates, existing, results)
+
+    return results
+
+
+def _record_changes(creates, updates, existing, results):
+    """
+    Change-feed events for the executemany writes, which the ORM flush
+    listener never sees.
+    """
+    session = db.session
+    change_feed.record(session, [results[i]["empCode"] for i, _, _ in creates], change_feed.CREATED)
+
+    for _, code, values in updates:
+        fields = set(values) - {"status"}
+        if "status" in values and values["status"] != existing[code][2]:
+            active = values["status"] == "Active"
+            change_feed.record(session, [code], change_feed.ENABLED if active else change_feed.DISABLED)
+        if fields:
+            change_feed.record(session, [code], change_feed.UPDATED, fields)
+
+
+# -------------------------------
+# CSV import (admin)
+# -------------------------------
+# Streams the file in batches of CSV_IMPORT_BATCH_SIZE rows. Each batch is
+# validated with the same set-based lookups, the explicit passwords are
+# hashed in a process pool (scrypt is CPU bound; rows without a password
+# share one hash of the temporary password), and users, employees, salary
+# and bank rows are written with executemany INSERTs inside a savepoint.
+# If the savepoint fails (e.g. a concurrent insert of the same email) the
+# batch is retried row by row so only the offending rows are reported.
+# Every batch commits on its own; an error never aborts the import.
+#
+# The import runs inside the upload request, so uploads are capped at
+# CSV_IMPORT_MAX_ROWS rows (see count_csv_rows); larger files go through
+# `flask admin import-employees`.
+
+CSV_COLUMNS = (
+    "emp_code", "first_name", "last_name", "work_email", "phone", "department", "job_title",
+    "date_of_joining", "role_id", "password", "manager_emp_code",
+    "ctc", "basic_percent", "hra_percent", "fixed_allowance", "medical_fixed",
+    "driver_reimbursement", "epf_percent",
+    "bank_name", "account_number", "ifsc_code", "account_holder_name"
+)
+CSV_REQUIRED = ("first_name", "last_name", "work_email", "date_of_joining")
+
+# Same defaults as the add-employee form
+SALARY_DEFAULTS = {
+    "basic_percent": 50, "hra_percent": 20, "fixed_allowance": 4532,
+    "medical_fixed": 1000, "driver_reimbursement": 1000, "epf_percent": 12
+}
+ACCOUNT_FIELDS = ("bank_name", "account_number", "ifsc_code", "account_holder_name")
+
+DEFAULT_CSV_BATCH_SIZE = 500
+DEFAULT_CSV_MAX_ROWS = 5000
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def _hash_workers():
+    return current_app.config.get("CSV_IMPORT_HASH_WORKERS") or os.cpu_count() or 1
+
+
+def _get_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            # Not fork: a child forked from a threaded web worker can inherit
+            # locks held by other threads and hang
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _hash_pool = ProcessPoolExecutor(max_workers=_hash_workers(), mp_context=context)
+    return _hash_pool
+
+
+def _hash_passwords(passwords):
+    if len(passwords) <= 1:
+        return [generate_password_hash(p) for p in passwords]
+    chunksize = max(len(passwords) // (_hash_workers() * 4), 1)
+    return list(_get_hash_pool().map(generate_password_hash, passwords, chunksize=chunksize))
+
+
+def _parse_csv_row(row, roles):
+    values = {k: (row.get(k) or "").strip() for k in CSV_COLUMNS}
+
+    missing = [f for f in CSV_REQUIRED if not values[f]]
+    if missing:
+        raise BulkRecordError(f"Missing fields: {missing}")
+
+    values["work_email"] = values["work_email"].lower()
+    try:
+        values["date_of_joining"] = datetime.strptime(values["date_of_joining"], "%Y-%m-%d").date()
+    except ValueError:
+        raise BulkRecordError("date_of_joining must be YYYY-MM-DD")
+
+    try:
+        values["role_id"] = int(values["role_id"]) if values["role_id"] else EMPLOYEE_ROLE_ID
+        for field in ("ctc",) + tuple(SALARY_DEFAULTS):
+            values[field] = float(values[field]) if values[field] else None
+    except ValueError:
+        raise BulkRecordError("role_id, ctc and salary columns must be numbers")
+    if values["role_id"] not in roles:
+        raise BulkRecordError(f"Unknown role_id {values['role_id']}")
+
+    if values["emp_code"] and not values["emp_code"].isdigit():
+        raise BulkRecordError("emp_code must be numeric")
+    return values
+
+
+def count_csv_rows(lines):
+    """
+    Number of data rows (after the header) in an iterable of CSV lines.
+    """
+    return max(sum(1 for _ in csv.reader(lines)) - 1, 0)
+
+
+def import_csv(lines, batch_size=None):
+    """
+    Imports employees from an iterable of CSV lines (header row first).
+    Returns {"rows", "created", "errors": [{"line", "work_email", "error"}]}.
+    """
+    batch_size = batch_size or current_app.config.get("CSV_IMPORT_BATCH_SIZE", DEFAULT_CSV_BATCH_SIZE)
+    reader = csv.DictReader(lines)
+
+    missing = [c for c in CSV_REQUIRED if c not in (reader.fieldnames or ())]
+    if missing:
+        raise BulkRecordError(f"CSV is missing columns: {missing}")
+
+    report = {"rows": 0, "created": 0, "errors": []}
+    state = {
+        "roles": set(ref_cache.roles()),
+        "seen_emails": set(),
+        "seen_codes": set(),
+        "temp_hash": None
+    }
+
+    batch = []
+    for row in reader:
+        # line_num: physical line in the file, for the error report
+        batch.append((reader.line_num, row))
+        if len(batch) >= batch_size:
+            _import_batch(batch, state, report)
+            batch = []
+    if batch:
+        _import_batch(batch, state, report)
+
+    report["errors"].sort(key=lambda e: e["line"])
+    return report
+
+
+def _import_batch(batch, state, report):
+    report["rows"] += len(batch)
+
+    def fail(line, email, message):
+        report["errors"].append({"line": line, "work_email": email, "error": message})
+
+    # ---------- parse ----------
+    parsed = []
+    for line, row in batch:
+        try:
+            parsed.append((line, _parse_csv_row(row, state["roles"])))
+        except BulkRecordError as e:
+            fail(line, (row.get("work_email") or "").strip(), str(e))
+
+    # ---------- set-based checks ----------
+    emails = [v["work_email"] for _, v in parsed]
+    taken = {e.lower() for e in _lookup(User.email, emails)}
+    taken.update(e.lower() for e in _lookup(Employee.work_email, emails))
+    codes = [v["emp_code"] for _, v in parsed if v["emp_code"]]
+    taken_codes = set(_lookup(Employee.emp_code, codes))
+
+    valid = []
+    for line, values in parsed:
+        email, code = values["work_email"], values["emp_code"]
+        if email in state["seen_emails"]:
+            fail(line, email, "Duplicate work_email in file")
+        elif email in taken:
+            fail(line, email, "Email already exists")
+        elif code and (code in state["seen_codes"] or code in taken_codes):
+            fail(line, email, f"emp_code {code} already exists")
+        else:
+            state["seen_emails"].add(email)
+            if code:
+                state["seen_codes"].add(code)
+            valid.append((line, values))
+
+    if not valid:
+        return
+
+    # ---------- passwords ----------
+    explicit = [v["password"] for _, v in valid if v["password"]]
+    hashes = iter(_hash_passwords(explicit))
+    for _, values in valid:
+        if values["password"]:
+            values["password_hash"] = next(hashes)
+        else:
+            if state["temp_hash"] is None:
+                state["temp_hash"] = generate_password_hash(TEMP_PASSWORD)
+            values["password_hash"] = state["temp_hash"]
+
+    # ---------- write ----------
+    try:
+        with db.session.begin_nested():
+            created = _write_rows(valid)
+        db.session.commit()
+        report["created"] += len(created)
+        return
+    except Exception:
+        db.session.rollback()
+
+    # Batch failed: isolate the bad rows
+    for line, values in valid:
+        try:
+            with db.session.begin_nested():
+                _write_rows([(line, values)])
+            db.session.commit()
+            report["created"] += 1
+        except Exception as e:
+            db.session.rollback()
+            fail(line, values["work_email"], _db_error(e))
+
+
+def _db_error(error):
+    message = str(getattr(error, "orig", None) or error)
+    return message.splitlines()[0][:200]
+
+
+def _write_rows(rows):
+    """
+    executemany INSERTs for one batch of validated rows (inside the
+    caller's savepoint). Returns the emp_codes created.
+    """
+    now = datetime.utcnow()
+
+    # ---------- users ----------
+    db.session.execute(insert(User), [
+        {
+            "email": v["work_email"],
+            "display_name": f"{v['first_name']} {v['last_name']}",
+            "password_hash": v["password_hash"],
+            "role_id": v["role_id"],
+            "is_active": True,
+            "must_change_password": True,
+            "created_at": now
+        }
+        for _, v in rows
+    ])
+    user_ids = {
+        e.lower(): k[0] for e, k in _lookup(User.email, [v["work_email"] for _, v in rows], User.id).items()
+    }
+
+    # ---------- emp codes ----------
+    given = [int(v["emp_code"]) for _, v in rows if v["emp_code"]]
+    if given:
+        sequences.advance_past(sequences.EMP_CODE, max(given))
+    missing = sum(1 for _, v in rows if not v["emp_code"])
+    new_codes = iter(sequences.allocate_emp_codes(missing) if missing else ())
+    codes = [v["emp_code"] or next(new_codes) for _, v in rows]
+
+    # ---------- employees ----------
+    db.session.execute(insert(Employee), [
+        {
+            "emp_code": code,
+            "emp_code_num": emp_code_number(code),
+            "user_id": user_ids[v["work_email"]],
+            "first_name": v["first_name"],
+            "last_name": v["last_name"],
+            "work_email": v["work_email"],
+            "phone": v["phone"] or None,
+            "department": v["department"] or None,
+            "job_title": v["job_title"] or None,
+            "date_of_joining": v["date_of_joining"],
+            "status": "Active",
+            "created_at": now,
+            "updated_at": now
+        }
+        for code, (_, v) in zip(codes, rows)
+    ])
+
+    # Managers may be earlier in the file, or in this batch
+    manager_codes = {v["manager_emp_code"] for _, v in rows if v["manager_emp_code"]}
+    if manager_codes:
+        manager_ids = {c: k[0] for c, k in _lookup(Employee.emp_code, manager_codes, Employee.id).items()}
+        employee_ids = {c: k[0] for c, k in _lookup(Employee.emp_code, codes, Employee.id).items()}
+        unknown = manager_codes - set(manager_ids)
+        if unknown:
+            raise BulkRecordError(f"Manager emp_code(s) not found: {sorted(unknown)}")
+        table = Employee.__table__
+        db.session.execute(
+            update(table).where(table.c.id == bindparam("emp_id")).values(manager_emp_id=bindparam("manager_id")),
+            [
+                {"emp_id": employee_ids[code], "manager_id": manager_ids[v["manager_emp_code"]]}
+                for code, (_, v) in zip(codes, rows) if v["manager_emp_code"]
+            ]
+        )
+        ref_cache.bump(ref_cache.REPORTING_LINES)
+
+    # ---------- salary ----------
+    salaries = []
+    for code, (_, v) in zip(codes, rows):
+        if v["ctc"] is None:
+            continue
+        salary = {f: v[f] if v[f] is not None else d for f, d in SALARY_DEFAULTS.items()}
+        salary.update(emp_code=code, gross_salary=v["ctc"], total_deductions=0, net_salary=v["ctc"])
+        salaries.append(salary)
+    if salaries:
+        db.session.execute(insert(EmployeeSalary), salaries)
+
+    # ---------- bank account ----------
+    accounts = [
+        dict({f: v[f] or None for f in ACCOUNT_FIELDS}, emp_code=code)
+        for code, (_, v) in zip(codes, rows)
+        if any(v[f] for f in ACCOUNT_FIELDS)
+    ]
+    if accounts:
+        db.session.execute(insert(EmployeeAccount), accounts)
+
+    change_feed.record(db.session, codes, change_feed.CREATED)
+    payroll_preview.mark_on_commit(db.session, emp_codes=codes)
+    return codes
+
+
+# -------------------------------
+# Bulk status change (API)
+# -------------------------------
+# Offboarding / contractor expiry: one UPDATE of employees.status and one
+# of users.is_active per LOOKUP_CHUNK codes, plus one executemany closing
+# the users' open attendance sessions when they lose access.
+
+STATUS_ACTIONS = {
+    "enable": "Active",
+    "disable": "Inactive",
+    "terminate": "Terminated"
+}
+
+
+def bulk_set_status(emp_codes, action):
+    """
+    Applies STATUS_ACTIONS[action] to the given codes (caller commits).
+    Returns {"results": [{"empCode", "result", "previousStatus"?}],
+    "closedSessions": n}; result is updated / unchanged / not_found.
+    """
+    status = STATUS_ACTIONS[action]
+    active = status == "Active"
+    codes = list(dict.fromkeys(str(c).strip() for c in emp_codes if str(c).strip()))
+
+    # emp_code -> (user id, status)
+    existing = _lookup(Employee.emp_code, codes, Employee.user_id, Employee.status)
+
+    results, changed = [], []
+    for code in codes:
+        if code not in existing:
+            results.append({"empCode": code, "result": "not_found"})
+            continue
+        previous = existing[code][1]
+        if previous == status:
+            results.append({"empCode": code, "result": "unchanged", "previousStatus": previous})
+        else:
+            changed.append(code)
+            results.append({"empCode": code, "result": "updated", "previousStatus": previous})
+
+    now = datetime.utcnow()
+    employees, users = Employee.__table__, User.__table__
+    user_ids = [existing[c][0] for c in changed if existing[c][0]]
+
+    # updated_at set explicitly: Core UPDATEs skip the ORM onupdate hook
+    for chunk in _chunks(changed):
+        db.session.execute(
+            update(employees).where(employees.c.emp_code.in_(chunk)).values(status=status, updated_at=now)
+        )
+    for chunk in _chunks(user_ids):
+        db.session.execute(update(users).where(users.c.id.in_(chunk)).values(is_active=active))
+
+    closed = 0 if active else _close_open_attendance(user_ids)
+
+    change_feed.record(db.session, changed, change_feed.ENABLED if active else change_feed.DISABLED, {"status"})
+    payroll_preview.mark_on_commit(db.session, emp_codes=changed, user_ids=user_ids if closed else ())
+    return {"results": results, "closedSessions": closed}
+
+
+def _close_open_attendance(user_ids):
+    """
+    Clocks out every open session of these users now; returns how many.
+    """
+    open_sessions = []
+    for chunk in _chunks(user_ids):
+        open_sessions += db.session.query(Attendance.id, Attendance.clock_in).filter(
+            Attendance.user_id.in_(chunk),
+            Attendance.clock_out.is_(None)
+        ).all()
+    if not open_sessions:
+        return 0
+
+    # Same arithmetic as the clock-out route (naive IST wall time)
+    now = datetime.now(IST)
+    clock_out = now.replace(tzinfo=None)
+    table = Attendance.__table__
+    db.session.execute(
+        update(table).where(table.c.id == bindparam("row_id")).values(
+            clock_out=bindparam("out"), duration_seconds=bindparam("seconds")
+        ),
+        [
+            {
+                "row_id": row_id,
+                "out": now,
+                "seconds": max(int((clock_out - clock_in.replace(tzinfo=None)).total_seconds()), 0)
+            }
+            for row_id, clock_in in open_sessions
+        ]
+    )
+    return len(open_sessions)
@@ -0,0 +1,164 @@
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import func, case
+
+from models.db import db
+from models.models import Employee, Leavee, LeaveBalance, LeaveAccrualRun
+from utils.leave_policy import entitlements, opening_entitlement
+from utils.leave_workflow import PENDING_STATUSES
+
+# -------------------------------
+# Accrual + carry-forward
+# -------------------------------
+# Writes absolute entitled / carried_forward values for every active
+# employee and entitled leave type, so re-running a period gives the same
+# result. consumed / pending belong to the approval workflow, which changes
+# them incrementally (leave_workflow.adjust_balance) while a run may be in
+# progress: the run only seeds them when it creates a ledger row and never
+# overwrites them. Employees are processed in id order in chunks; each
+# chunk is three reads and batched bulk upserts, and the run row records
+# the last employee done so an interrupted run resumes.
+
+DEFAULT_CHUNK_SIZE = 2000
+UPSERT_BATCH = 500      # rows per INSERT statement (bind-parameter limits)
+
+# Columns overwritten on existing ledger rows
+UPSERT_FIELDS = ("entitled", "carried_forward", "updated_at")
+
+
+def run_accrual(year, month=None, restart=False, chunk_size=None):
+    """
+    Accrues leave for `year` through `month` (the whole year if None) and
+    carries unused days over from year - 1. Commits after every chunk.
+    Returns the LeaveAccrualRun.
+    """
+    chunk_size = chunk_size or current_app.config.get("LEAVE_ACCRUAL_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    through_month = month or 12
+
+    run = db.session.get(LeaveAccrualRun, (year, month or 0))
+    if run is None:
+        run = LeaveAccrualRun(year=year, month=month or 0, status="RUNNING", last_emp_id=0, processed=0)
+        db.session.add(run)
+    elif run.status == "COMPLETED" and not restart:
+        return run
+    elif restart:
+        run.status = "RUNNING"
+        run.last_emp_id = 0
+        run.processed = 0
+        run.started_at = datetime.utcnow()
+        run.finished_at = None
+    db.session.commit()
+
+    annual = entitlements()
+    year_start, year_end = date(year, 1, 1), date(year, 12, 31)
+
+    while True:
+        emps = db.session.query(
+            Employee.id, Employee.emp_code, Employee.date_of_joining
+        ).filter(
+            Employee.id > run.last_emp_id,
+            Employee.status == "Active"
+        ).order_by(Employee.id).limit(chunk_size).all()
+
+        if not emps:
+            break
+
+        codes = [e.emp_code for e in emps]
+
+        # This year's usage per (emp_code, leave_type), for new ledger rows
+        usage = {
+            (code, leave_type): (consumed or 0, pending or 0)
+            for code, leave_type, consumed, pending in db.session.query(
+                Leavee.emp_code,
+                Leavee.leave_type,
+                func.sum(case((Leavee.status == "APPROVED", Leavee.total_days), else_=0)),
+                func.sum(case((Leavee.status.in_(PENDING_STATUSES), Leavee.total_days), else_=0))
+            ).filter(
+                Leavee.emp_code.in_(codes),
+                Leavee.leave_type.in_(list(annual)),
+                Leavee.start_date.between(year_start, year_end)
+            ).group_by(Leavee.emp_code, Leavee.leave_type)
+        }
+
+        # Last year's unused balance per (emp_code, leave_type)
+        unused = {
+            (b.emp_code, b.leave_type): (b.entitled or 0) - (b.consumed or 0) - (b.pending or 0)
+            for b in db.session.query(
+                LeaveBalance.emp_code, LeaveBalance.leave_type,
+                LeaveBalance.entitled, LeaveBalance.consumed, LeaveBalance.pending
+            ).filter(
+                LeaveBalance.emp_code.in_(codes),
+                LeaveBalance.year == year - 1
+            )
+        }
+
+        now = datetime.utcnow()
+        rows = []
+        for e in emps:
+            for leave_type in annual:
+                entitled, carried = opening_entitlement(
+                    leave_type, year, through_month, e.date_of_joining, unused.get((e.emp_code, leave_type), 0)
+                )
+                consumed, pending = usage.get((e.emp_code, leave_type), (0, 0))
+                rows.append({
+                    "emp_code": e.emp_code,
+                    "leave_type": leave_type,
+                    "year": year,
+                    "entitled": entitled,
+                    "carried_forward": carried,
+                    "consumed": consumed,
+                    "pending": pending,
+                    "updated_at": now
+                })
+
+        for i in range(0, len(rows), UPSERT_BATCH):
+            _upsert_balances(rows[i:i + UPSERT_BATCH])
+
+        run.last_emp_id = emps[-1].id
+        run.processed += len(emps)
+        db.session.commit()
+
+    run.status = "COMPLETED"
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return run
+
+
+def _upsert_balances(rows):
+    """
+    Multi-row INSERT ... ON DUPLICATE KEY UPDATE (MySQL) or
+    ON CONFLICT DO UPDATE (SQLite / PostgreSQL) of UPSERT_FIELDS only.
+    """
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(LeaveBalance).values(rows)
+        stmt = stmt.on_duplicate_key_update({f: stmt.inserted[f] for f in UPSERT_FIELDS})
+
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(LeaveBalance).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["emp_code", "leave_type", "year"],
+            set_={f: stmt.excluded[f] for f in UPSERT_FIELDS}
+        )
+
+    else:
+        for row in rows:
+            balance = db.session.get(LeaveBalance, (row["emp_code"], row["leave_type"], row["year"]))
+            if balance is None:
+                db.session.add(LeaveBalance(**row))
+            else:
+                for field in UPSERT_FIELDS:
+                    setattr(balance, field, row[field])
+        return
+
+    db.session.execute(stmt)
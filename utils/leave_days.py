@@ -0,0 +1,102 @@
+from datetime import date
+
+from sqlalchemy import delete
+
+from models.db import db
+from models.models import EmployeeLeaveDay, Leavee
+from utils.business_calendar import working_dates_between
+from utils import payroll_preview
+
+# -------------------------------
+# Approved leaves, one row per working day
+# -------------------------------
+# Written when a leave reaches APPROVED, so payroll and reports count
+# leave days per month with an indexed range count instead of charging a
+# whole leave to the month it starts in.
+
+INSERT_CHUNK = 5000
+
+
+def _day_rows(leave, start=None, end=None):
+    start = max(leave.start_date, start) if start else leave.start_date
+    end = min(leave.end_date, end) if end else leave.end_date
+    return [
+        {
+            "leave_id": leave.id,
+            "day": d,
+            "emp_code": leave.emp_code,
+            "leave_type": leave.leave_type
+        }
+        for d in working_dates_between(start, end)
+    ]
+
+
+def add_leaves(leaves):
+    """
+    Expands approved leaves (Leavee objects or rows with the same
+    attributes) into day rows. Idempotent; caller commits.
+    """
+    if any(getattr(l, "id", None) is None for l in leaves):
+        db.session.flush()
+
+    ids = [l.id for l in leaves]
+    if not ids:
+        return
+
+    db.session.execute(
+        delete(EmployeeLeaveDay).where(EmployeeLeaveDay.leave_id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+
+    rows = [row for l in leaves for row in _day_rows(l)]
+    if rows:
+        db.session.bulk_insert_mappings(EmployeeLeaveDay, rows)
+
+
+def drop_day(day):
+    """
+    Removes the rows for a date that stopped being a working day (a new
+    holiday; see leave_workflow.apply_new_holiday). Caller commits.
+    """
+    db.session.execute(
+        delete(EmployeeLeaveDay).where(EmployeeLeaveDay.day == day)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rebuild(year=None):
+    """
+    Rebuilds the table (or one calendar year of it) from the approved
+    leaves and commits. Returns the number of day rows written.
+    """
+    stmt = delete(EmployeeLeaveDay)
+    leaves_q = Leavee.query.filter(Leavee.status == "APPROVED")
+    first = last = None
+
+    if year is not None:
+        first, last = date(year, 1, 1), date(year, 12, 31)
+        stmt = stmt.where(EmployeeLeaveDay.day.between(first, last))
+        leaves_q = leaves_q.filter(Leavee.start_date <= last, Leavee.end_date >= first)
+
+    db.session.execute(stmt.execution_options(synchronize_session=False))
+
+    written = 0
+    batch = []
+    leaves = leaves_q.with_entities(
+        Leavee.id, Leavee.emp_code, Leavee.leave_type, Leavee.start_date, Leavee.end_date
+    ).all()
+
+    for leave in leaves:
+        batch.extend(_day_rows(leave, first, last))
+        if len(batch) >= INSERT_CHUNK:
+            db.session.bulk_insert_mappings(EmployeeLeaveDay, batch)
+            written += len(batch)
+            batch = []
+
+    if batch:
+        db.session.bulk_insert_mappings(EmployeeLeaveDay, batch)
+        written += len(batch)
+
+    db.session.commit()
+    payroll_preview.mark_month_dirty(year)
+    return written
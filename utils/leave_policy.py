@@ -0,0 +1,119 @@
+from flask import current_app
+from sqlalchemy import func, case
+
+from models.db import db
+from models.models import Employee, LeaveBalance, LeaveAccrualRun
+
+# -------------------------------
+# Leave entitlements (instance/config.py → LEAVE_ENTITLEMENTS)
+# -------------------------------
+# Annual days per leave type. Types not listed (e.g. Leave Without Pay)
+# have no balance.
+
+DEFAULT_ENTITLEMENTS = {
+    "Casual Leave": 6,
+    "Sick Leave": 6
+}
+
+# Unused days that move into the next year, per type (default: none)
+DEFAULT_CARRY_FORWARD_CAPS = {}
+
+_entitlements = None
+
+
+def entitlements():
+    """
+    Loaded from config on first use and reused for the life of the process.
+    """
+    global _entitlements
+    if _entitlements is None:
+        _entitlements = dict(current_app.config.get("LEAVE_ENTITLEMENTS", DEFAULT_ENTITLEMENTS))
+    return _entitlements
+
+
+def entitlement(leave_type):
+    return entitlements().get(leave_type)
+
+
+def carry_forward_cap(leave_type):
+    caps = current_app.config.get("LEAVE_CARRY_FORWARD_CAPS", DEFAULT_CARRY_FORWARD_CAPS)
+    return caps.get(leave_type, 0)
+
+
+# -------------------------------
+# Opening entitlement of a ledger row
+# -------------------------------
+# One rule for every path that creates a leave_balance row (the accrual
+# run, the approval workflow, rebuilds) and for balances shown before the
+# row exists: the annual days pro-rated from the joining month through the
+# month the year has been accrued to, plus last year's unused days up to
+# the carry-forward cap.
+def accrued_days(annual, year, through_month, date_of_joining):
+    """
+    Annual days pro-rated by the months worked in the year up to
+    through_month (inclusive), rounded down to half days.
+    """
+    first_month = 1
+    if date_of_joining and date_of_joining.year == year:
+        first_month = date_of_joining.month
+    elif date_of_joining and date_of_joining.year > year:
+        return 0
+
+    months = max(through_month - first_month + 1, 0)
+    return int(annual * months / 12 * 2) / 2
+
+
+def opening_entitlement(leave_type, year, through_month, date_of_joining, unused_last_year=0):
+    """
+    (entitled, carried_forward) for a ledger row.
+    """
+    carried = min(max(unused_last_year, 0), carry_forward_cap(leave_type))
+    annual = entitlement(leave_type) or 0
+    return accrued_days(annual, year, through_month, date_of_joining) + carried, carried
+
+
+def accrued_through(years):
+    """
+    year -> month the latest completed accrual run reached (a full-year
+    run counts as 12). Years without a run are granted in full: 12.
+    """
+    reached = dict(db.session.query(
+        LeaveAccrualRun.year,
+        func.max(case((LeaveAccrualRun.month == 0, 12), else_=LeaveAccrualRun.month))
+    ).filter(
+        LeaveAccrualRun.year.in_(list(years)),
+        LeaveAccrualRun.status == "COMPLETED"
+    ).group_by(LeaveAccrualRun.year).all())
+    return {year: reached.get(year, 12) for year in years}
+
+
+def opening_balances(keys):
+    """
+    (emp_code, leave_type, year) -> (entitled, carried_forward) for ledger
+    rows that don't exist yet, in three queries whatever the number of keys.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    codes = list({code for code, _, _ in keys})
+    years = {year for _, _, year in keys}
+
+    joined = dict(db.session.query(Employee.emp_code, Employee.date_of_joining).filter(
+        Employee.emp_code.in_(codes)
+    ).all())
+    unused = {
+        (b.emp_code, b.leave_type, b.year + 1): (b.entitled or 0) - (b.consumed or 0) - (b.pending or 0)
+        for b in db.session.query(
+            LeaveBalance.emp_code, LeaveBalance.leave_type, LeaveBalance.year,
+            LeaveBalance.entitled, LeaveBalance.consumed, LeaveBalance.pending
+        ).filter(
+            LeaveBalance.emp_code.in_(codes),
+            LeaveBalance.year.in_([year - 1 for year in years])
+        )
+    }
+    through = accrued_through(years)
+
+    return {
+        key: opening_entitlement(key[1], key[2], through[key[2]], joined.get(key[0]), unused.get(key, 0))
+        for key in keys
+    }
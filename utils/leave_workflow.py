@@ -0,0 +1,519 @@
+from datetime import datetime
+
+from sqlalchemy import update, select, func, case, extract
+from sqlalchemy.exc import IntegrityError
+
+from models.db import db
+from models.models import Employee, Leavee, LeaveBalance, Holiday
+from utils.business_calendar import working_days_between, SUNDAY
+from utils.leave_policy import entitlement, opening_balances
+from utils import leave_days, payroll_preview, ref_cache
+
+PENDING_STATUSES = ("PENDING_L1", "PENDING_L2")
+# Requests that still hold (or will hold) the dates
+ACTIVE_STATUSES = ("APPROVED",) + PENDING_STATUSES
+
+# Max ids per bulk approve / reject request
+MAX_BULK_DECISIONS = 500
+
+
+class LeaveRequestError(Exception):
+    """
+    Submission rejected; the message is shown to the user.
+    """
+
+
+# -------------------------------
+# Balance ledger
+# -------------------------------
+def leave_year(leave):
+    return leave.start_date.year
+
+
+def get_balance(emp_code, leave_type, year, for_update=False):
+    """
+    Primary-key lookup. Returns a dict even if no ledger row exists yet.
+    for_update reads the latest committed row and locks it.
+    """
+    if for_update:
+        row = LeaveBalance.query.filter_by(
+            emp_code=emp_code, leave_type=leave_type, year=year
+        ).populate_existing().with_for_update().first()
+    else:
+        row = db.session.get(LeaveBalance, (emp_code, leave_type, year))
+    if row:
+        entitled = row.entitled
+    else:
+        entitled = opening_balances([(emp_code, leave_type, year)])[(emp_code, leave_type, year)][0]
+    consumed = row.consumed if row else 0
+    pending = row.pending if row else 0
+    return {
+        "entitled": entitled,
+        "consumed": consumed,
+        "pending": pending,
+        "available": entitled - consumed - pending
+    }
+
+
+def adjust_balance(emp_code, leave_type, year, consumed=0, pending=0):
+    """
+    Adds to the ledger row inside the caller's transaction, creating it
+    on first use.
+    """
+    key = (
+        (LeaveBalance.emp_code == emp_code) &
+        (LeaveBalance.leave_type == leave_type) &
+        (LeaveBalance.year == year)
+    )
+    stmt = update(LeaveBalance).where(key).values(
+        consumed=LeaveBalance.consumed + consumed,
+        pending=LeaveBalance.pending + pending,
+        updated_at=datetime.utcnow()
+    ).execution_options(synchronize_session=False)
+
+    if db.session.execute(stmt).rowcount:
+        return
+
+    entitled, carried = opening_balances([(emp_code, leave_type, year)])[(emp_code, leave_type, year)]
+    try:
+        with db.session.begin_nested():
+            db.session.add(LeaveBalance(
+                emp_code=emp_code,
+                leave_type=leave_type,
+                year=year,
+                entitled=entitled,
+                carried_forward=carried,
+                consumed=consumed,
+                pending=pending
+            ))
+    except IntegrityError:
+        # Created concurrently; apply the delta to that row instead
+        db.session.execute(stmt)
+
+
+def rebuild_balances(year=None):
+    """
+    Recomputes consumed / pending from employee_leaves with one grouped
+    query. Entitlements on existing rows are left untouched.
+    Returns the number of ledger rows written.
+    """
+    lv_year = extract("year", Leavee.start_date)
+
+    q = db.session.query(
+        Leavee.emp_code,
+        Leavee.leave_type,
+        lv_year,
+        func.coalesce(func.sum(case((Leavee.status == "APPROVED", Leavee.total_days), else_=0)), 0),
+        func.coalesce(func.sum(case((Leavee.status.in_(PENDING_STATUSES), Leavee.total_days), else_=0)), 0)
+    )
+    if year is not None:
+        q = q.filter(lv_year == year)
+    totals = {
+        (code, leave_type, int(y)): (consumed, pending)
+        for code, leave_type, y, consumed, pending in q.group_by(Leavee.emp_code, Leavee.leave_type, lv_year)
+    }
+
+    existing_q = LeaveBalance.query
+    if year is not None:
+        existing_q = existing_q.filter(LeaveBalance.year == year)
+    existing = {(b.emp_code, b.leave_type, b.year) for b in existing_q}
+
+    now = datetime.utcnow()
+    updates, inserts = [], []
+
+    for key in existing:
+        consumed, pending = totals.get(key, (0, 0))
+        updates.append({
+            "emp_code": key[0], "leave_type": key[1], "year": key[2],
+            "consumed": consumed, "pending": pending, "updated_at": now
+        })
+
+    opening = opening_balances(key for key in totals if key not in existing)
+    for key, (entitled, carried) in opening.items():
+        consumed, pending = totals[key]
+        inserts.append({
+            "emp_code": key[0], "leave_type": key[1], "year": key[2],
+            "entitled": entitled, "carried_forward": carried,
+            "consumed": consumed, "pending": pending, "updated_at": now
+        })
+
+    db.session.bulk_update_mappings(LeaveBalance, updates)
+    db.session.bulk_insert_mappings(LeaveBalance, inserts)
+    db.session.commit()
+    return len(updates) + len(inserts)
+
+
+# -------------------------------
+# Submit
+# -------------------------------
+def submit_leave_request(emp, start, end, leave_type, reason, employee_name):
+    """
+    Validates and adds a new Leavee (caller commits).
+    Raises LeaveRequestError with a user-facing message.
+    """
+    # Only working days count (Sundays / holidays excluded)
+    total_days = working_days_between(start, end)
+    if total_days <= 0:
+        raise LeaveRequestError("Selected dates contain no working days.")
+
+    # Lock the employee row so concurrent submits for the same person run
+    # the balance check and the overlap probe one at a time
+    db.session.query(Employee.id).filter(Employee.id == emp.id).with_for_update().first()
+
+    if entitlement(leave_type) is not None:
+        balance = get_balance(emp.emp_code, leave_type, start.year, for_update=True)
+        if total_days > balance["available"]:
+            raise LeaveRequestError(
+                f"Insufficient {leave_type} balance ({balance['available']:g} day(s) left)."
+            )
+
+    clash = find_overlapping(emp.emp_code, start, end)
+    if clash:
+        raise LeaveRequestError(
+            f"You already have a {clash.leave_type} request from "
+            f"{clash.start_date:%d-%m-%Y} to {clash.end_date:%d-%m-%Y} ({clash.status})."
+        )
+
+    config = ref_cache.approval_config()
+
+    # -----------------------------------------
+    # LEVEL 1 APPROVER
+    # -----------------------------------------
+    if config.use_manager_l1:
+        # employee.manager is another Employee object
+        if not emp.manager:
+            raise LeaveRequestError("Manager not configured for your profile!")
+        level1_approver_user_id = emp.manager.user_id
+    else:
+        # Normal fixed user_id
+        level1_approver_user_id = (
+            int(config.level1_approver_id)
+            if config.level1_approver_id else None
+        )
+
+    # -----------------------------------------
+    # LEVEL 2 APPROVER
+    # -----------------------------------------
+    level2_approver_user_id = (
+        int(config.level2_approver_id)
+        if config.level2_approver_id else None
+    )
+
+    leave = Leavee(
+        emp_code=emp.emp_code,
+        start_date=start,
+        end_date=end,
+        total_days=total_days,
+        reason=reason,
+        employee_name=employee_name,
+        leave_type=leave_type,
+        status="PENDING_L1",
+        level1_approver_id=level1_approver_user_id,
+        level2_approver_id=level2_approver_user_id,
+        current_approver_id=level1_approver_user_id
+    )
+    db.session.add(leave)
+
+    adjust_balance(emp.emp_code, leave_type, start.year, pending=total_days)
+
+    # Nobody approves their own leave: skip the L1 step, and auto-approve
+    # if they are the L2 approver as well.
+    if emp.user_id is not None and level1_approver_user_id == emp.user_id:
+        _route_to_level2(leave, emp.user_id)
+
+    return leave
+
+
+def find_overlapping(emp_code, start, end):
+    """
+    First active request of emp_code overlapping [start, end], or None.
+    One range probe on the (emp_code, start_date, end_date) index.
+    """
+    return db.session.query(
+        Leavee.id, Leavee.leave_type, Leavee.status, Leavee.start_date, Leavee.end_date
+    ).filter(
+        Leavee.emp_code == emp_code,
+        Leavee.start_date <= end,
+        Leavee.end_date >= start,
+        Leavee.status.in_(ACTIVE_STATUSES)
+    ).first()
+
+
+def scan_overlaps():
+    """
+    Historical overlaps across the whole table in one ordered pass: per
+    employee, each request is compared with the earlier request reaching
+    furthest. Yields (earlier_row, overlapping_row).
+    """
+    rows = db.session.query(
+        Leavee.id, Leavee.emp_code, Leavee.leave_type, Leavee.status,
+        Leavee.start_date, Leavee.end_date
+    ).filter(
+        Leavee.status.in_(ACTIVE_STATUSES)
+    ).order_by(
+        Leavee.emp_code, Leavee.start_date, Leavee.id
+    ).yield_per(1000)
+
+    reach = None
+    for row in rows:
+        if reach is not None and reach.emp_code == row.emp_code and row.start_date <= reach.end_date:
+            yield reach, row
+            if row.end_date > reach.end_date:
+                reach = row
+        else:
+            reach = row
+
+
+def _route_to_level2(leave, requester_user_id, decided_at=None):
+    leave.status = "PENDING_L2"
+    leave.current_approver_id = leave.level2_approver_id
+    if decided_at:
+        leave.level1_decision_date = decided_at
+
+    if requester_user_id is not None and leave.level2_approver_id == requester_user_id:
+        mark_approved(leave)
+
+
+def route_self_approvals():
+    """
+    One-off fix for requests created before routing happened at submit
+    time: set-based UPDATEs, then ledger and leave-day rebuilds.
+    Returns the number of requests moved.
+    """
+    requester = select(Employee.user_id).where(
+        Employee.emp_code == Leavee.emp_code
+    ).scalar_subquery()
+
+    moved = db.session.execute(
+        update(Leavee).where(
+            Leavee.status == "PENDING_L1",
+            Leavee.current_approver_id == requester
+        ).values(
+            status="PENDING_L2",
+            current_approver_id=Leavee.level2_approver_id
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+
+    moved += db.session.execute(
+        update(Leavee).where(
+            Leavee.status == "PENDING_L2",
+            Leavee.current_approver_id == requester
+        ).values(
+            status="APPROVED",
+            current_approver_id=None
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+
+    db.session.commit()
+    rebuild_balances()
+    leave_days.rebuild()
+    return moved
+
+
+# -------------------------------
+# New holidays
+# -------------------------------
+def apply_new_holiday(day):
+    """
+    Call before adding a Holiday on `day` (caller commits). Active leaves
+    spanning that working day lose it: total_days, the ledger and the
+    approved leave-day rows change in the caller's transaction.
+    Returns the number of leaves adjusted.
+    """
+    if day.weekday() == SUNDAY:
+        return 0
+    if db.session.query(Holiday.query.filter(Holiday.date == day).exists()).scalar():
+        return 0
+
+    leaves = db.session.query(
+        Leavee.id, Leavee.emp_code, Leavee.leave_type, Leavee.status, Leavee.start_date
+    ).filter(
+        Leavee.start_date <= day,
+        Leavee.end_date >= day,
+        Leavee.status.in_(ACTIVE_STATUSES)
+    ).with_for_update().all()
+
+    if leaves:
+        db.session.execute(
+            update(Leavee).where(Leavee.id.in_([l.id for l in leaves])).values(
+                total_days=Leavee.total_days - 1
+            ).execution_options(synchronize_session=False)
+        )
+
+        # (emp_code, leave_type, year) -> [consumed, pending] days to give back
+        deltas = {}
+        for l in leaves:
+            delta = deltas.setdefault((l.emp_code, l.leave_type, l.start_date.year), [0, 0])
+            delta[0 if l.status == "APPROVED" else 1] += 1
+        for (emp_code, leave_type, year), (consumed, pending) in deltas.items():
+            adjust_balance(emp_code, leave_type, year, consumed=-consumed, pending=-pending)
+
+        payroll_preview.mark_on_commit(db.session, emp_codes={l.emp_code for l in leaves})
+
+    leave_days.drop_day(day)
+    return len(leaves)
+
+
+# -------------------------------
+# Approve / Reject
+# -------------------------------
+def mark_approved(leave, decided_at=None):
+    """
+    Final approval: moves the days from pending to consumed.
+    """
+    leave.status = "APPROVED"
+    leave.current_approver_id = None
+    if decided_at:
+        leave.level2_decision_date = decided_at
+
+    adjust_balance(
+        leave.emp_code, leave.leave_type, leave_year(leave),
+        consumed=leave.total_days, pending=-leave.total_days
+    )
+    leave_days.add_leaves([leave])
+
+
+def approve(leave):
+    if leave.status == "PENDING_L1":
+        requester_user_id = db.session.query(Employee.user_id).filter_by(
+            emp_code=leave.emp_code
+        ).scalar()
+        _route_to_level2(leave, requester_user_id, decided_at=datetime.now())
+
+    elif leave.status == "PENDING_L2":
+        mark_approved(leave, decided_at=datetime.now())
+
+
+def reject(leave):
+    was_pending = leave.status in PENDING_STATUSES
+
+    if leave.status == "PENDING_L1":
+        leave.status = "REJECTED_L1"
+        leave.level1_decision_date = datetime.now()
+
+    elif leave.status == "PENDING_L2":
+        leave.status = "REJECTED_L2"
+        leave.level2_decision_date = datetime.now()
+
+    leave.current_approver_id = None
+
+    if was_pending:
+        adjust_balance(
+            leave.emp_code, leave.leave_type, leave_year(leave),
+            pending=-leave.total_days
+        )
+
+
+# -------------------------------
+# Bulk decisions
+# -------------------------------
+def bulk_decide(approver_user_id, leave_ids, approve):
+    """
+    Approve or reject many leaves in one transaction (caller commits).
+    Authorization is checked for all ids with one query and the status
+    transitions are applied as set-based UPDATEs.
+    Returns [{"id", "result", "status"}] in input order.
+
+    The rows are read FOR UPDATE, so a concurrent approver (or a double
+    click) waits and then sees the new status; ledger, leave-day and
+    result side effects only follow rows this call actually moved.
+    """
+    ids = list(dict.fromkeys(int(i) for i in leave_ids))
+
+    rows = db.session.query(
+        Leavee.id, Leavee.status, Leavee.current_approver_id,
+        Leavee.emp_code, Leavee.leave_type, Leavee.total_days,
+        Leavee.start_date, Leavee.end_date, Leavee.level2_approver_id,
+        Employee.user_id.label("requester_user_id")
+    ).outerjoin(
+        Employee, Employee.emp_code == Leavee.emp_code
+    ).filter(Leavee.id.in_(ids)).with_for_update(of=Leavee).all() if ids else []
+
+    found = {r.id: r for r in rows}
+    results = {}
+    level1, level2, level1_final = [], [], []
+
+    for leave_id in ids:
+        r = found.get(leave_id)
+        if r is None:
+            results[leave_id] = ("not_found", None)
+        elif r.current_approver_id != approver_user_id:
+            results[leave_id] = ("not_authorized", r.status)
+        elif r.status == "PENDING_L1":
+            # Approving at L1 for a requester who is the L2 approver finishes it
+            if approve and r.requester_user_id is not None and r.level2_approver_id == r.requester_user_id:
+                level1_final.append(r)
+            else:
+                level1.append(r)
+        elif r.status == "PENDING_L2":
+            level2.append(r)
+        else:
+            results[leave_id] = ("invalid_status", r.status)
+
+    now = datetime.now()
+    guard = Leavee.current_approver_id == approver_user_id
+
+    def apply(batch, expected_status, **values):
+        if not batch:
+            return
+        moved = db.session.execute(
+            update(Leavee).where(
+                Leavee.id.in_([r.id for r in batch]),
+                Leavee.status == expected_status,
+                guard
+            ).values(**values).execution_options(synchronize_session=False)
+        ).rowcount
+        # The rows are locked, so the guard can only miss if the lock was
+        # not taken; fail rather than book the ledger for rows that stayed
+        if moved != len(batch):
+            raise RuntimeError(
+                f"Bulk decision matched {moved} of {len(batch)} leaves; they changed concurrently"
+            )
+
+    if approve:
+        apply(level1, "PENDING_L1", status="PENDING_L2", level1_decision_date=now,
+              current_approver_id=Leavee.level2_approver_id)
+        apply(level1_final, "PENDING_L1", status="APPROVED", level1_decision_date=now,
+              current_approver_id=None)
+        apply(level2, "PENDING_L2", status="APPROVED", level2_decision_date=now,
+              current_approver_id=None)
+
+        for r in level1:
+            results[r.id] = ("forwarded", "PENDING_L2")
+        finished = level1_final + level2
+        for r in finished:
+            results[r.id] = ("approved", "APPROVED")
+        _bulk_adjust(finished, consumed=1, pending=-1)
+        leave_days.add_leaves(finished)
+
+    else:
+        apply(level1 + level1_final, "PENDING_L1", status="REJECTED_L1", level1_decision_date=now,
+              current_approver_id=None)
+        apply(level2, "PENDING_L2", status="REJECTED_L2", level2_decision_date=now,
+              current_approver_id=None)
+
+        finished = level1 + level1_final + level2
+        for r in finished:
+            results[r.id] = ("rejected", "REJECTED_L1" if r.status == "PENDING_L1" else "REJECTED_L2")
+        _bulk_adjust(finished, consumed=0, pending=-1)
+
+    payroll_preview.mark_on_commit(db.session, emp_codes=[r.emp_code for r in finished])
+
+    return [
+        {"id": leave_id, "result": results[leave_id][0], "status": results[leave_id][1]}
+        for leave_id in ids
+    ]
+
+
+def _bulk_adjust(rows, consumed, pending):
+    """
+    One ledger update per (emp_code, leave_type, year) touched.
+    """
+    deltas = {}
+    for r in rows:
+        key = (r.emp_code, r.leave_type, r.start_date.year)
+        deltas[key] = deltas.get(key, 0) + r.total_days
+
+    for (emp_code, leave_type, year), days in deltas.items():
+        adjust_balance(emp_code, leave_type, year,
+                       consumed=consumed * days, pending=pending * days)
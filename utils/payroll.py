@@ -0,0 +1,236 @@
+import calendar
+from datetime import date
+
+from sqlalchemy import func, case, or_, extract
+
+from models.db import db
+from models.models import Employee, EmployeeSalary, EmployeeLeaveDay, Attendance
+from utils.business_calendar import working_days_in_month
+
+PAID_LEAVE_TYPES = ("Casual Leave", "Sick Leave")
+LWP_LEAVE_TYPE = "Leave Without Pay"
+
+# Attendance rows shorter than this don't count as a present day
+ADMIN_MIN_ATTENDANCE_SECONDS = 5
+
+
+def month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+# -------------------------------
+# Aggregates (one GROUP BY query each)
+# -------------------------------
+def _leave_day_counts():
+    """
+    Distinct paid / LWP leave days, so overlapping leaves count a day once.
+    """
+    day = EmployeeLeaveDay.day
+    return (
+        func.count(func.distinct(case((EmployeeLeaveDay.leave_type.in_(PAID_LEAVE_TYPES), day)))),
+        func.count(func.distinct(case((EmployeeLeaveDay.leave_type == LWP_LEAVE_TYPE, day))))
+    )
+
+
+def load_month_aggregates(year, month, user_ids=None, emp_codes=None,
+                          min_attendance_seconds=ADMIN_MIN_ATTENDANCE_SECONDS):
+    """
+    Returns (attendance_days_by_user_id, leave_days_by_emp_code) where
+    leave_days_by_emp_code[code] = {"paid": n, "lwp": n}, counting the
+    approved leave days that fall inside the month.
+    """
+    first, last = month_bounds(year, month)
+
+    att_q = db.session.query(
+        Attendance.user_id,
+        func.count(func.distinct(Attendance.date))
+    ).filter(
+        Attendance.date.between(first, last),
+        Attendance.duration_seconds >= min_attendance_seconds
+    )
+    if user_ids is not None:
+        att_q = att_q.filter(Attendance.user_id.in_(user_ids))
+    attendance = {uid: int(n or 0) for uid, n in att_q.group_by(Attendance.user_id)}
+
+    leave_q = db.session.query(
+        EmployeeLeaveDay.emp_code, *_leave_day_counts()
+    ).filter(
+        EmployeeLeaveDay.day.between(first, last)
+    )
+    if emp_codes is not None:
+        leave_q = leave_q.filter(EmployeeLeaveDay.emp_code.in_(emp_codes))
+    leaves = {
+        code: {"paid": int(paid or 0), "lwp": int(lwp or 0)}
+        for code, paid, lwp in leave_q.group_by(EmployeeLeaveDay.emp_code)
+    }
+
+    return attendance, leaves
+
+
+# -------------------------------
+# Salary row
+# -------------------------------
+def build_payroll_row(emp, salary, year, month, total_working_days,
+                      attendance_days, paid_leave_days, lwp_days):
+    present_days = int(attendance_days + paid_leave_days)
+    lwp_days = int(lwp_days)
+
+    absent_days = total_working_days - present_days - lwp_days
+    if absent_days < 0:
+        absent_days = 0
+
+    monthly_salary = float(salary.gross_salary)
+    salary_per_day = round(monthly_salary / total_working_days, 2)
+    net_salary = round(present_days * salary_per_day, 2)
+    lwp_deduction = round(monthly_salary - net_salary, 2)
+
+    return {
+        "emp_code": emp.emp_code,
+        "name": f"{emp.first_name} {emp.last_name}",
+        "salary_month": f"{calendar.month_name[month]} {year}",
+        "total_working_days": total_working_days,
+        "attendance_days": attendance_days,
+        "paid_leave_days": paid_leave_days,
+        "present_days": present_days,
+        "lwp_days": lwp_days,
+        "absent_days": absent_days,
+        "gross_salary": round(monthly_salary, 2),
+        "lwp_deduction": lwp_deduction,
+        "net_salary": net_salary
+    }
+
+
+def employee_month(emp, salary, year, month,
+                   min_attendance_seconds=ADMIN_MIN_ATTENDANCE_SECONDS):
+    """
+    Payroll row for a single employee (used by the payslip download).
+    """
+    attendance, leaves = load_month_aggregates(
+        year, month,
+        user_ids=[emp.user_id],
+        emp_codes=[emp.emp_code],
+        min_attendance_seconds=min_attendance_seconds
+    )
+    leave = leaves.get(emp.emp_code, {"paid": 0, "lwp": 0})
+
+    return build_payroll_row(
+        emp, salary, year, month,
+        working_days_in_month(year, month),
+        attendance.get(emp.user_id, 0),
+        leave["paid"],
+        leave["lwp"]
+    )
+
+
+def compute_payroll(year, month, emp_codes=None, user_ids=None):
+    """
+    Payroll rows for active employees with a salary record, keyed by emp_code.
+    With emp_codes / user_ids only those employees are computed.
+    Runs a fixed number of queries regardless of headcount.
+    """
+    total_working_days = working_days_in_month(year, month)
+
+    q = db.session.query(Employee, EmployeeSalary).join(
+        EmployeeSalary, EmployeeSalary.emp_code == Employee.emp_code
+    ).filter(Employee.status == "Active")
+
+    if emp_codes is not None or user_ids is not None:
+        q = q.filter(or_(
+            Employee.emp_code.in_(emp_codes or []),
+            Employee.user_id.in_(user_ids or [])
+        ))
+
+    pairs = q.all()
+    if not pairs:
+        return {}
+
+    limit_to = emp_codes is not None or user_ids is not None
+    attendance, leaves = load_month_aggregates(
+        year, month,
+        user_ids=[e.user_id for e, _ in pairs] if limit_to else None,
+        emp_codes=[e.emp_code for e, _ in pairs] if limit_to else None
+    )
+
+    rows = {}
+    for emp, salary in pairs:
+        leave = leaves.get(emp.emp_code, {"paid": 0, "lwp": 0})
+        row = build_payroll_row(
+            emp, salary, year, month, total_working_days,
+            attendance.get(emp.user_id, 0),
+            leave["paid"],
+            leave["lwp"]
+        )
+        row["user_id"] = emp.user_id
+        rows[emp.emp_code] = row
+    return rows
+
+
+# -------------------------------
+# Multi-month batch
+# -------------------------------
+def iter_months(start_year, start_month, end_year, end_month):
+    y, m = start_year, start_month
+    while (y, m) <= (end_year, end_month):
+        yield y, m
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+
+def load_range_aggregates(start_year, start_month, end_year, end_month,
+                          min_attendance_seconds=ADMIN_MIN_ATTENDANCE_SECONDS):
+    """
+    Same as load_month_aggregates but for a span of months, in one query
+    per table. Keys are (user_id | emp_code, year, month).
+    """
+    first, _ = month_bounds(start_year, start_month)
+    _, last = month_bounds(end_year, end_month)
+
+    att_year = extract("year", Attendance.date)
+    att_month = extract("month", Attendance.date)
+    attendance = {
+        (uid, int(y), int(m)): int(n or 0)
+        for uid, y, m, n in db.session.query(
+            Attendance.user_id, att_year, att_month,
+            func.count(func.distinct(Attendance.date))
+        ).filter(
+            Attendance.date.between(first, last),
+            Attendance.duration_seconds >= min_attendance_seconds
+        ).group_by(Attendance.user_id, att_year, att_month)
+    }
+
+    lv_year = extract("year", EmployeeLeaveDay.day)
+    lv_month = extract("month", EmployeeLeaveDay.day)
+    leaves = {
+        (code, int(y), int(m)): {"paid": int(paid or 0), "lwp": int(lwp or 0)}
+        for code, y, m, paid, lwp in db.session.query(
+            EmployeeLeaveDay.emp_code, lv_year, lv_month, *_leave_day_counts()
+        ).filter(
+            EmployeeLeaveDay.day.between(first, last)
+        ).group_by(EmployeeLeaveDay.emp_code, lv_year, lv_month)
+    }
+
+    return attendance, leaves
+
+
+def iter_payroll_range(start_year, start_month, end_year, end_month):
+    """
+    Yields payroll rows month by month for every active employee with a
+    salary record. Three queries in total, whatever the span.
+    """
+    pairs = db.session.query(Employee, EmployeeSalary).join(
+        EmployeeSalary, EmployeeSalary.emp_code == Employee.emp_code
+    ).filter(Employee.status == "Active").order_by(Employee.id).all()
+
+    attendance, leaves = load_range_aggregates(start_year, start_month, end_year, end_month)
+    no_leave = {"paid": 0, "lwp": 0}
+
+    for year, month in iter_months(start_year, start_month, end_year, end_month):
+        total_working_days = working_days_in_month(year, month)
+
+        for emp, salary in pairs:
+            leave = leaves.get((emp.emp_code, year, month), no_leave)
+            yield build_payroll_row(
+                emp, salary, year, month, total_working_days,
+                attendance.get((emp.user_id, year, month), 0),
+                leave["paid"],
+                leave["lwp"]
+            )
@@ -0,0 +1,183 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models.db import db
+from models.models import Employee, EmployeeSalary, PayrollJob, PayrollJobRow
+from utils.payroll import compute_payroll
+
+# -------------------------------
+# Background pay runs
+# -------------------------------
+# The HTTP request only creates the PayrollJob row and returns its id.
+# A worker thread computes the payroll in chunks, writing rows and progress
+# after each chunk so the UI can poll status and page through results.
+#
+# The thread lives in the web process, so a restart or a killed worker
+# leaves its job behind. Each chunk commit refreshes heartbeat_at, and
+# reap_stale_jobs() fails jobs that stopped beating (run when a job is
+# started or polled). The thread writes status and progress only with
+# conditional UPDATEs on the expected status (see _update_job), so a job
+# the reaper failed stays FAILED even if its thread is still going.
+
+DEFAULT_CHUNK_SIZE = 200
+DEFAULT_WORKERS = 1
+DEFAULT_STALE_SECONDS = 600
+
+ROW_FIELDS = (
+    "emp_code", "name", "salary_month", "total_working_days",
+    "attendance_days", "paid_leave_days", "present_days", "lwp_days",
+    "absent_days", "gross_salary", "lwp_deduction", "net_salary"
+)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config.get("PAYROLL_JOB_WORKERS", DEFAULT_WORKERS),
+            thread_name_prefix="payroll-job"
+        )
+    return _executor
+
+
+def start_job(year, month):
+    reap_stale_jobs()
+
+    job = PayrollJob(year=year, month=month, status="QUEUED")
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    chunk_size = app.config.get("PAYROLL_JOB_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    _get_executor().submit(_run_job, app, job.id, chunk_size)
+    return job
+
+
+class _JobLost(Exception):
+    """The job left RUNNING under the thread (reaped)."""
+
+
+def _update_job(job_id, expected_status, **values):
+    """
+    UPDATE payroll_job ... WHERE status = expected_status; the status is
+    the claim, so a job the reaper failed is never written over.
+    Returns whether the row matched.
+    """
+    return PayrollJob.query.filter(
+        PayrollJob.id == job_id,
+        PayrollJob.status == expected_status
+    ).update(values, synchronize_session=False) == 1
+
+
+def _run_job(app, job_id, chunk_size):
+    with app.app_context():
+        try:
+            now = datetime.utcnow()
+            if not _update_job(job_id, "QUEUED", status="RUNNING", started_at=now, heartbeat_at=now):
+                db.session.rollback()
+                return      # reaped while waiting in the queue
+            db.session.commit()
+            job = db.session.get(PayrollJob, job_id)
+
+            codes = [
+                code for (code,) in db.session.query(Employee.emp_code).join(
+                    EmployeeSalary, EmployeeSalary.emp_code == Employee.emp_code
+                ).filter(
+                    Employee.status == "Active"
+                ).order_by(Employee.id)
+            ]
+            if not _update_job(job_id, "RUNNING", total=len(codes)):
+                raise _JobLost()
+            db.session.commit()
+
+            for i in range(0, len(codes), chunk_size):
+                chunk = codes[i:i + chunk_size]
+                rows = compute_payroll(job.year, job.month, emp_codes=chunk)
+
+                db.session.bulk_insert_mappings(PayrollJobRow, [
+                    dict({f: rows[code][f] for f in ROW_FIELDS}, job_id=job_id)
+                    for code in chunk if code in rows
+                ])
+                if not _update_job(job_id, "RUNNING", processed=i + len(chunk), heartbeat_at=datetime.utcnow()):
+                    raise _JobLost()
+                db.session.commit()
+
+            if not _update_job(job_id, "RUNNING", status="COMPLETED", finished_at=datetime.utcnow()):
+                raise _JobLost()
+            db.session.commit()
+
+        except _JobLost:
+            # Already FAILED by reap_stale_jobs(); keep its status and error
+            db.session.rollback()
+
+        except Exception as e:
+            db.session.rollback()
+            _update_job(job_id, "RUNNING", status="FAILED", error=str(e), finished_at=datetime.utcnow())
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def reap_stale_jobs():
+    """
+    Marks FAILED the RUNNING jobs without a heartbeat for
+    PAYROLL_JOB_STALE_SECONDS, and the QUEUED jobs that old when no job
+    is running (their executor is gone). Commits; returns the count.
+    """
+    stale_seconds = current_app.config.get("PAYROLL_JOB_STALE_SECONDS", DEFAULT_STALE_SECONDS)
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=stale_seconds)
+
+    reaped = PayrollJob.query.filter(
+        PayrollJob.status == "RUNNING",
+        PayrollJob.heartbeat_at < cutoff
+    ).update({
+        "status": "FAILED",
+        "error": "Worker stopped responding",
+        "finished_at": now
+    }, synchronize_session=False)
+
+    live = db.session.query(PayrollJob.id).filter(PayrollJob.status == "RUNNING").first()
+    if live is None:
+        reaped += PayrollJob.query.filter(
+            PayrollJob.status == "QUEUED",
+            PayrollJob.created_at < cutoff
+        ).update({
+            "status": "FAILED",
+            "error": "Job was never picked up by a worker",
+            "finished_at": now
+        }, synchronize_session=False)
+
+    db.session.commit()
+    return reaped
+
+
+# -------------------------------
+# Read side
+# -------------------------------
+def job_status(job):
+    return {
+        "id": job.id,
+        "month": job.month,
+        "year": job.year,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "percent": round(job.processed * 100 / job.total) if job.total else (100 if job.status == "COMPLETED" else 0),
+        "error": job.error
+    }
+
+
+def job_rows(job_id, page, per_page):
+    """
+    One page of result rows (available while the job is still running).
+    """
+    rows = PayrollJobRow.query.filter_by(job_id=job_id).order_by(
+        PayrollJobRow.id
+    ).offset((page - 1) * per_page).limit(per_page + 1).all()
+
+    return [{f: getattr(r, f) for f in ROW_FIELDS} for r in rows[:per_page]], len(rows) > per_page
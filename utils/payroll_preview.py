@@ -0,0 +1,235 @@
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, func, insert, delete
+from sqlalchemy.orm import Session
+
+from models.db import db
+from models.models import Employee, EmployeeSalary, Leavee, Holiday, Attendance, PayrollDirtyMark
+from utils.payroll import compute_payroll
+from utils import ref_cache
+
+# -------------------------------
+# Cached payroll preview per month
+# -------------------------------
+# A preview is computed once per (year, month) in each worker process.
+# Writes to the tables the calculation reads append payroll_dirty_mark
+# rows in their own transaction (ORM writes from the flush listener below,
+# set-based writes via mark_on_commit / mark_month_on_commit). Before
+# serving a preview a process reads the marks committed since its last
+# look (one primary-key range query) and recomputes only those rows, so a
+# write in any gunicorn worker reaches every worker's cache.
+#
+# Mark ids are taken at insert time, so a slow transaction can commit a
+# lower id after a higher one was read. The watermark only moves past
+# marks older than SETTLE_SECONDS; younger ones are read again (and their
+# rows recomputed) on the next call. A write transaction held open longer
+# than that can still be missed.
+
+MAX_CACHED_MONTHS = 24
+SETTLE_SECONDS = 30
+MARK_RETENTION = timedelta(days=1)
+PRUNE_EVERY = timedelta(hours=1)
+
+_previews = OrderedDict()
+_lock = threading.Lock()
+_marks = {"last_id": None, "synced_at": None, "pruned_at": None}
+
+
+class _MonthPreview:
+    def __init__(self, holidays_version=0):
+        self.rows = None                # emp_code -> row (insertion ordered), None until computed
+        self.holidays_version = holidays_version
+        self.dirty_codes = set()
+        self.dirty_users = set()
+        self.all_dirty = False
+        # One computation per month at a time; marks that arrive meanwhile
+        # stay on the entry for the next call
+        self.compute_lock = threading.Lock()
+
+    def codes_for_users(self, user_ids):
+        return {code for code, row in self.rows.items() if row.get("user_id") in user_ids}
+
+    def take_dirty(self):
+        taken = (self.all_dirty or self.rows is None, self.dirty_codes, self.dirty_users)
+        self.all_dirty, self.dirty_codes, self.dirty_users = False, set(), set()
+        return taken
+
+
+def get_preview(year, month):
+    """
+    Returns the list of payroll rows for the month, recomputing only
+    what changed since the last call.
+    """
+    key = (year, month)
+    _sync_marks()
+    holidays_version = ref_cache.version(ref_cache.HOLIDAYS)
+
+    with _lock:
+        entry = _previews.get(key)
+        if entry is None:
+            entry = _previews[key] = _MonthPreview(holidays_version)
+            while len(_previews) > MAX_CACHED_MONTHS:
+                _previews.popitem(last=False)
+        _previews.move_to_end(key)
+
+    with entry.compute_lock:
+        with _lock:
+            if entry.holidays_version != holidays_version:
+                entry.holidays_version = holidays_version
+                entry.all_dirty = True
+            all_dirty, dirty_codes, dirty_users = entry.take_dirty()
+
+        if all_dirty:
+            rows = compute_payroll(year, month)
+            with _lock:
+                entry.rows = rows
+
+        elif dirty_codes or dirty_users:
+            fresh = compute_payroll(year, month, emp_codes=dirty_codes, user_ids=dirty_users)
+            with _lock:
+                stale = dirty_codes | entry.codes_for_users(dirty_users)
+                for code in stale - fresh.keys():
+                    entry.rows.pop(code, None)
+                entry.rows.update(fresh)
+
+        with _lock:
+            return list(entry.rows.values())
+
+
+# -------------------------------
+# Reading marks
+# -------------------------------
+def _apply_mark(emp_code, user_id, year, month):
+    if emp_code is not None or user_id is not None:
+        for entry in _previews.values():
+            if emp_code is not None:
+                entry.dirty_codes.add(emp_code)
+            if user_id is not None:
+                entry.dirty_users.add(user_id)
+        return
+    for (y, m), entry in _previews.items():
+        if year is None or (y == year and (month is None or m == month)):
+            entry.all_dirty = True
+
+
+def _sync_marks():
+    """
+    Applies the marks committed since the last call to the cached months.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=SETTLE_SECONDS)
+
+    if _marks["last_id"] is None or _marks["synced_at"] < now - MARK_RETENTION:
+        # First call, or idle long enough that old marks may be pruned:
+        # start again from an empty cache
+        last_id = db.session.query(func.max(PayrollDirtyMark.id)).filter(
+            PayrollDirtyMark.created_at <= cutoff
+        ).scalar() or 0
+        with _lock:
+            _previews.clear()
+            _marks.update(last_id=last_id, synced_at=now)
+        return
+
+    rows = db.session.query(
+        PayrollDirtyMark.id, PayrollDirtyMark.emp_code, PayrollDirtyMark.user_id,
+        PayrollDirtyMark.year, PayrollDirtyMark.month, PayrollDirtyMark.created_at
+    ).filter(PayrollDirtyMark.id > _marks["last_id"]).order_by(PayrollDirtyMark.id).all()
+
+    settled_id = None
+    for row in rows:
+        if row.created_at > cutoff:
+            break
+        settled_id = row.id
+
+    with _lock:
+        for row in rows:
+            _apply_mark(row.emp_code, row.user_id, row.year, row.month)
+        if settled_id is not None:
+            _marks["last_id"] = max(_marks["last_id"], settled_id)
+        _marks["synced_at"] = now
+
+    if _marks["pruned_at"] is None or _marks["pruned_at"] < now - PRUNE_EVERY:
+        _marks["pruned_at"] = now
+        # Own short transaction; the caller's session may be mid-request
+        with db.engine.begin() as connection:
+            connection.execute(delete(PayrollDirtyMark).where(PayrollDirtyMark.created_at < now - MARK_RETENTION))
+
+
+# -------------------------------
+# Writing marks
+# -------------------------------
+def _write_marks(session, marks):
+    """
+    Inserts (emp_code, user_id, year, month) marks in the session's
+    transaction, once per mark per transaction.
+    """
+    seen = session.info.setdefault("payroll_marked", set())
+    new = [m for m in dict.fromkeys(marks) if m not in seen]
+    if not new:
+        return
+    seen.update(new)
+
+    now = datetime.utcnow()
+    session.connection().execute(insert(PayrollDirtyMark), [
+        {"emp_code": code, "user_id": user_id, "year": year, "month": month, "created_at": now}
+        for code, user_id, year, month in new
+    ])
+
+
+def mark_on_commit(session, emp_codes=(), user_ids=()):
+    """
+    For set-based UPDATEs the flush listener can't see: marks the
+    employees dirty in every process once the session commits.
+    """
+    _write_marks(session, [(str(c), None, None, None) for c in emp_codes if c is not None] +
+                          [(None, u, None, None) for u in user_ids if u is not None])
+
+
+def mark_month_on_commit(session, year=None, month=None):
+    """
+    Whole-month invalidation; a year alone marks all its months, no
+    arguments every cached month.
+    """
+    _write_marks(session, [(None, None, year, month)])
+
+
+def mark_month_dirty(year=None, month=None):
+    """
+    mark_month_on_commit for callers that have already committed.
+    """
+    with Session(db.engine) as session, session.begin():
+        mark_month_on_commit(session, year, month)
+
+
+# Marks are written on flush, in the same transaction as the change, so a
+# preview computed before the commit can't consume a mark for data it
+# couldn't see yet.
+@event.listens_for(Session, "after_flush")
+def _collect_payroll_changes(session, flush_context):
+    marks = []
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Attendance):
+            if obj.user_id is not None:
+                marks.append((None, obj.user_id, None, None))
+        elif isinstance(obj, (Leavee, EmployeeSalary, Employee)):
+            marks.append((str(obj.emp_code), None, None, None))
+            if isinstance(obj, Employee) and obj.user_id is not None:
+                marks.append((None, obj.user_id, None, None))
+        elif isinstance(obj, Holiday):
+            if isinstance(obj.date, date):
+                marks.append((None, None, obj.date.year, obj.date.month))
+            else:
+                marks.append((None, None, None, None))
+
+    if marks:
+        _write_marks(session, marks)
+
+
+# A rolled-back savepoint drops its marks too, so forget what was written
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_soft_rollback")
+def _reset_marked(session, *args):
+    session.info.pop("payroll_marked", None)
@@ -0,0 +1,143 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+
+# -------------------------------
+# Defaults (override in instance/config.py)
+# -------------------------------
+DEFAULT_MAX_CONCURRENCY = 2     # wkhtmltopdf processes running at once
+DEFAULT_MAX_QUEUE = 8           # requests allowed to wait for a slot
+DEFAULT_QUEUE_TIMEOUT = 30      # seconds a queued request waits
+DEFAULT_RETRY_AFTER = 10        # seconds suggested to the client
+
+
+class RenderQueueFull(Exception):
+    """
+    Raised when no render slot is free and the wait queue is full
+    (or the wait timed out).
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("PDF renderer busy")
+        self.retry_after = retry_after
+
+
+class RenderGate:
+    """
+    Limits how many PDF renders run at once in this process.
+    Extra callers wait in a bounded queue; anything beyond that fails fast.
+    """
+
+    def __init__(self, max_concurrency, max_queue, queue_timeout, retry_after):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+
+        # metrics
+        self._rendered = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._max_queue_depth = 0
+
+    def acquire(self):
+        start = time.monotonic()
+
+        with self._cond:
+            if self._active < self.max_concurrency and self._waiting == 0:
+                self._active += 1
+                return 0.0
+
+            if self._waiting >= self.max_queue:
+                self._rejected += 1
+                raise RenderQueueFull(self.retry_after)
+
+            self._waiting += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._waiting)
+            try:
+                got_slot = self._cond.wait_for(
+                    lambda: self._active < self.max_concurrency,
+                    timeout=self.queue_timeout
+                )
+            finally:
+                self._waiting -= 1
+
+            if not got_slot:
+                self._timed_out += 1
+                raise RenderQueueFull(self.retry_after)
+
+            self._active += 1
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return waited
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._rendered += 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queue_depth": self._waiting,
+                "max_queue_depth": self._max_queue_depth,
+                "rendered": self._rendered,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "avg_wait_seconds": round(self._total_wait / self._rendered, 3) if self._rendered else 0,
+                "max_wait_seconds": round(self._max_wait, 3)
+            }
+
+
+# -------------------------------
+# Process-wide gate shared by the payslip routes
+# -------------------------------
+_gate = None
+_gate_lock = threading.Lock()
+
+
+def get_render_gate():
+    global _gate
+    if _gate is None:
+        with _gate_lock:
+            if _gate is None:
+                cfg = current_app.config
+                _gate = RenderGate(
+                    max_concurrency=cfg.get("PDF_RENDER_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY),
+                    max_queue=cfg.get("PDF_RENDER_MAX_QUEUE", DEFAULT_MAX_QUEUE),
+                    queue_timeout=cfg.get("PDF_RENDER_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT),
+                    retry_after=cfg.get("PDF_RENDER_RETRY_AFTER", DEFAULT_RETRY_AFTER)
+                )
+    return _gate
+
+
+def render_slot():
+    """
+    Usage:
+        with render_slot():
+            pdf_bytes = pdfkit.from_string(...)
+    """
+    return get_render_gate().slot()
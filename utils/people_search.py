@@ -0,0 +1,316 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func
+
+from models.db import db
+from models.models import Employee, User, EmployeeChangeEvent
+from utils import change_feed
+
+# -------------------------------
+# In-memory people search (typeahead)
+# -------------------------------
+# One entry per user (with their employee profile, if any) and per
+# employee without a login. Two structures per process:
+#   _tokens    sorted [(token, key)] for prefix matches via bisect
+#   _trigrams  trigram -> {key} for substring matches (3+ characters) in
+#              names and email local parts
+# The index is built by the first search in each worker. Writes are
+# picked up from the employee change feed: each search first applies the
+# events committed since the last one it saw (one indexed query), in this
+# worker or any other.
+#
+# Event ids are taken at insert time, so a slow transaction can commit a
+# lower id after a higher one was read. As with change_feed.read_changes,
+# the watermark only moves past events older than the settle window
+# (CHANGE_FEED_SETTLE_SECONDS); younger ids are remembered once applied
+# and the window is read again on each search, so a late commit is
+# still picked up.
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_CANDIDATES = 1000
+
+Person = namedtuple(
+    "Person", "key user_id emp_id emp_code name email department job_title status date_of_joining text"
+)
+
+_SPLIT = re.compile(r"[\s@._\-/,()]+")
+
+_lock = threading.RLock()
+_people = {}        # key -> Person
+_tokens = []        # sorted (token, key)
+_trigrams = {}      # trigram -> set(key)
+_by_code = {}       # emp_code -> key
+_build_lock = threading.Lock()
+_state = {"built": False, "last_event_id": 0, "applied": set()}
+
+
+# -------------------------------
+# Documents
+# -------------------------------
+def _tokenize(*values):
+    tokens = set()
+    for value in values:
+        if not value:
+            continue
+        value = str(value).lower()
+        tokens.add(value)
+        tokens.update(t for t in _SPLIT.split(value) if t)
+    return tokens
+
+
+def _trigrams_of(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _gram_text(person):
+    """
+    Substring matching covers the name and the email's local part;
+    department, job title and code are short shared tokens that prefix
+    matching already finds.
+    """
+    return f"{person.name} {(person.email or '').split('@')[0]}".lower()
+
+
+def _person(user_id, emp_id, emp_code, first_name, last_name, display_name, email,
+            department, job_title, status, date_of_joining):
+    name = f"{first_name} {last_name}".strip() if first_name else (display_name or "")
+    key = f"u{user_id}" if user_id else f"e{emp_id}"
+    text = " ".join(str(v).lower() for v in (name, email, emp_code, department, job_title) if v)
+    return Person(key, user_id, emp_id, emp_code, name, email, department, job_title, status,
+                  date_of_joining, text)
+
+
+def _person_tokens(person):
+    return _tokenize(person.name, person.email, person.emp_code, person.department, person.job_title)
+
+
+def _add(person, sorted_insert=True):
+    _people[person.key] = person
+    for token in _person_tokens(person):
+        if sorted_insert:
+            insort(_tokens, (token, person.key))
+        else:
+            _tokens.append((token, person.key))
+    for gram in _trigrams_of(_gram_text(person)):
+        _trigrams.setdefault(gram, set()).add(person.key)
+    if person.emp_code:
+        _by_code[person.emp_code] = person.key
+
+
+def _remove(key):
+    person = _people.pop(key, None)
+    if person is None:
+        return
+    for token in _person_tokens(person):
+        i = bisect_left(_tokens, (token, key))
+        if i < len(_tokens) and _tokens[i] == (token, key):
+            del _tokens[i]
+    for gram in _trigrams_of(_gram_text(person)):
+        keys = _trigrams.get(gram)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _trigrams[gram]
+    if person.emp_code and _by_code.get(person.emp_code) == key:
+        del _by_code[person.emp_code]
+
+
+def _load(user_filter=None, employee_filter=None):
+    """
+    Person rows: users (outer-joined to their employee) and employees
+    without a user.
+    """
+    columns = (
+        Employee.emp_code, Employee.first_name, Employee.last_name, User.display_name,
+        func.coalesce(Employee.work_email, User.email), Employee.department, Employee.job_title,
+        Employee.status, Employee.date_of_joining
+    )
+    users = db.session.query(User.id, Employee.id, *columns).outerjoin(Employee, Employee.user_id == User.id)
+    orphans = db.session.query(Employee.user_id, Employee.id, *columns).outerjoin(
+        User, User.id == Employee.user_id
+    ).filter(Employee.user_id.is_(None))
+
+    if user_filter is not None:
+        users = users.filter(user_filter)
+    if employee_filter is not None:
+        orphans = orphans.filter(employee_filter)
+    return [_person(*row) for row in users.all() + orphans.all()]
+
+
+# -------------------------------
+# Build / refresh
+# -------------------------------
+def _settle_cutoff():
+    settle = current_app.config.get("CHANGE_FEED_SETTLE_SECONDS", change_feed.DEFAULT_SETTLE_SECONDS)
+    return datetime.utcnow() - timedelta(seconds=settle)
+
+
+def build():
+    """
+    Full (re)build from the database.
+    """
+    # Events inside the settle window are re-applied by the next refresh
+    last_event_id = db.session.query(func.max(EmployeeChangeEvent.id)).filter(
+        EmployeeChangeEvent.created_at <= _settle_cutoff()
+    ).scalar() or 0
+    people = _load()
+    with _lock:
+        _people.clear()
+        _tokens.clear()
+        _trigrams.clear()
+        _by_code.clear()
+        for person in people:
+            _add(person, sorted_insert=False)
+        _tokens.sort()
+        _state.update(built=True, last_event_id=last_event_id, applied=set())
+    return len(people)
+
+
+def refresh():
+    """
+    Applies change-feed events not yet seen; builds the index on first use.
+    """
+    if not _state["built"]:
+        with _build_lock:
+            if not _state["built"]:
+                build()
+        return
+
+    cutoff = _settle_cutoff()
+    rows = db.session.query(
+        EmployeeChangeEvent.id, EmployeeChangeEvent.emp_code, EmployeeChangeEvent.created_at
+    ).filter(
+        EmployeeChangeEvent.id > _state["last_event_id"]
+    ).order_by(EmployeeChangeEvent.id).all()
+
+    settled_id = None
+    for row in rows:
+        if row.created_at > cutoff:
+            break
+        settled_id = row.id
+
+    new = [row for row in rows if row.id not in _state["applied"]]
+    if new:
+        _apply(new)
+
+    with _lock:
+        if settled_id is not None:
+            _state["last_event_id"] = max(_state["last_event_id"], settled_id)
+        last_event_id = _state["last_event_id"]
+        _state["applied"] = {i for i in _state["applied"] | {row.id for row in new} if i > last_event_id}
+
+
+def _apply(rows):
+    """
+    Reloads the people behind the events' emp_codes.
+    """
+    codes = {row.emp_code for row in rows}
+    employees = db.session.query(Employee.id, Employee.user_id).filter(Employee.emp_code.in_(codes)).all()
+    user_ids = [u for _, u in employees if u]
+    orphan_ids = [e for e, u in employees if not u]
+
+    people = []
+    if user_ids:
+        people += _load(user_filter=User.id.in_(user_ids))
+    if orphan_ids:
+        people += _load(employee_filter=Employee.id.in_(orphan_ids))
+
+    with _lock:
+        for code in codes:
+            key = _by_code.get(code)
+            if key:
+                _remove(key)
+        for person in people:
+            _remove(person.key)
+            _add(person)
+
+
+# -------------------------------
+# Search
+# -------------------------------
+# Candidates come from the most selective query word only (smallest
+# prefix range, else smallest trigram set), capped at MAX_CANDIDATES in
+# rank order: whole-token matches, then prefixes, then substrings. The
+# other words are checked against each candidate's text. This keeps a
+# query over 50k people to a few thousand dict / string operations.
+def _prefix_range(word):
+    return bisect_left(_tokens, (word,)), bisect_left(_tokens, (word + "\uffff",))
+
+
+def _estimate(word):
+    lo, hi = _prefix_range(word)
+    if hi > lo or len(word) < 3:
+        return hi - lo
+    return min((len(_trigrams.get(g, ())) for g in _trigrams_of(word)), default=0)
+
+
+def _candidates(word):
+    """
+    key -> score (3 whole token, 2 token prefix, 1 substring).
+    """
+    found = {}
+    lo, hi = _prefix_range(word)
+    for token, key in _tokens[lo:min(hi, lo + MAX_CANDIDATES * 4)]:
+        if key not in found:
+            found[key] = 3 if token == word else 2
+        if len(found) >= MAX_CANDIDATES:
+            return found
+
+    if len(word) >= 3:
+        grams = sorted((_trigrams.get(g, set()) for g in _trigrams_of(word)), key=len)
+        for key in grams[0] if grams else ():
+            if key not in found and word in _people[key].text:
+                found[key] = 1
+                if len(found) >= MAX_CANDIDATES:
+                    break
+    return found
+
+
+def _word_score(word, text):
+    if word not in text:
+        return 0
+    return 2 if (" " + word) in (" " + text) else 1
+
+
+def search(query, limit=DEFAULT_LIMIT, active_only=False):
+    """
+    Top `limit` people matching every word of `query` (prefix of any
+    token, or substring of a name / email for 3+ characters). Returns
+    Person tuples.
+    """
+    refresh()
+    words = [w for w in _SPLIT.split(query.lower()) if w]
+    if not words:
+        return []
+    limit = min(max(limit, 1), MAX_LIMIT)
+
+    with _lock:
+        words.sort(key=_estimate)
+        driver, rest = words[0], words[1:]
+
+        scores = {}
+        for key, score in _candidates(driver).items():
+            person = _people[key]
+            if active_only and person.status not in (None, "Active"):
+                continue
+            for word in rest:
+                matched = _word_score(word, person.text)
+                if not matched:
+                    break
+                score += matched
+            else:
+                scores[key] = score
+
+        exact = _by_code.get(query.strip())
+        if exact in scores:
+            scores[exact] += 10
+
+        return heapq.nsmallest(limit, (_people[k] for k in scores),
+                               key=lambda p: (-scores[p.key], p.name.lower()))
@@ -0,0 +1,32 @@
+from flask import g, has_app_context
+from sqlalchemy import event
+
+from models.db import db
+
+# -------------------------------
+# Per-request SQL statement counter
+# -------------------------------
+# Counts statements sent to the engine while handling a request. With
+# QUERY_COUNT_HEADER = True in config the count is returned in an
+# X-Query-Count response header, which makes N+1 regressions visible
+# from the browser's network tab.
+
+
+def query_count():
+    return g.get("_query_count", 0)
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g._query_count = g.get("_query_count", 0) + 1
+
+
+def init_app(app):
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _on_execute)
+
+    @app.after_request
+    def _add_query_count_header(response):
+        if app.config.get("QUERY_COUNT_HEADER"):
+            response.headers["X-Query-Count"] = str(query_count())
+        return response
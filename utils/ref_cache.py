@@ -0,0 +1,194 @@
+import threading
+from collections import namedtuple
+
+from flask import g, has_app_context
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from models.db import db
+from models.models import CacheVersion, Role, LeaveApprovalConfig, Holiday, Employee
+
+# -------------------------------
+# Reference data cache (per process, versioned in the DB)
+# -------------------------------
+# Roles, the leave approval config and holidays are read on almost every
+# page but change rarely. Each set is cached per process together with
+# the cache_version it was loaded at. The version rows are read once per
+# request (one small query), so a write in any gunicorn worker is picked
+# up by the others on their next request without a shared cache server.
+#
+# ORM writes to the watched tables bump their version automatically in
+# the same transaction; set-based UPDATEs must call bump() themselves.
+
+ROLES = "roles"
+APPROVAL_CONFIG = "approval_config"
+HOLIDAYS = "holidays"
+REPORTING_LINES = "reporting_lines"     # Employee.manager_emp_id (approver flags)
+
+NAMES = (ROLES, APPROVAL_CONFIG, HOLIDAYS, REPORTING_LINES)
+
+ApprovalConfig = namedtuple("ApprovalConfig", "level1_approver_id level2_approver_id use_manager_l1")
+HolidayRow = namedtuple("HolidayRow", "id date day occasion")
+
+_entries = {}       # name -> (version, value)
+_lock = threading.Lock()
+
+
+# -------------------------------
+# Versions
+# -------------------------------
+def _load_versions():
+    return dict(db.session.query(CacheVersion.name, CacheVersion.version).all())
+
+
+def versions():
+    """
+    name -> version, read once per request (app context).
+    """
+    if not has_app_context():
+        return _load_versions()
+    current = g.get("_ref_versions")
+    if current is None:
+        current = g._ref_versions = _load_versions()
+    return current
+
+
+def version(name):
+    return versions().get(name, 0)
+
+
+def ensure_versions():
+    """
+    Creates the missing version rows (called at startup).
+    """
+    existing = set(_load_versions())
+    missing = [n for n in NAMES if n not in existing]
+    if missing:
+        db.session.add_all(CacheVersion(name=n, version=0) for n in missing)
+        db.session.commit()
+
+
+def bump(name, session=None):
+    """
+    Increments the version inside the caller's transaction; other
+    processes reload once it commits.
+    """
+    session = session or db.session
+    _bump(session.connection(), name)
+    session.info.setdefault("ref_cache_bumped", set()).add(name)
+
+
+def _bump(connection, name):
+    table = CacheVersion.__table__
+    updated = connection.execute(
+        update(table).where(table.c.name == name).values(version=table.c.version + 1)
+    ).rowcount
+    if not updated:
+        connection.execute(table.insert().values(name=name, version=1))
+
+
+# -------------------------------
+# Cached sets
+# -------------------------------
+def _get(name, loader):
+    current = version(name)
+    entry = _entries.get(name)
+    if entry is not None and entry[0] == current:
+        return entry[1]
+
+    value = loader()
+    with _lock:
+        _entries[name] = (current, value)
+    return value
+
+
+def roles():
+    """
+    role_id -> role name.
+    """
+    return _get(ROLES, lambda: dict(db.session.query(Role.id, Role.name).all()))
+
+
+def role_name(role_id):
+    """
+    Lower-cased role name, "" if unknown.
+    """
+    name = roles().get(role_id)
+    return name.lower() if name else ""
+
+
+def approval_config():
+    """
+    Snapshot of the LeaveApprovalConfig row, or None if not configured.
+    """
+    def load():
+        config = LeaveApprovalConfig.query.first()
+        if not config:
+            return None
+        return ApprovalConfig(config.level1_approver_id, config.level2_approver_id, config.use_manager_l1)
+
+    return _get(APPROVAL_CONFIG, load)
+
+
+def holidays():
+    return _get(HOLIDAYS, lambda: [
+        HolidayRow(h.id, h.date, h.day, h.occasion)
+        for h in Holiday.query.order_by(Holiday.date).all()
+    ])
+
+
+def invalidate(name=None):
+    with _lock:
+        if name is None:
+            _entries.clear()
+        else:
+            _entries.pop(name, None)
+
+
+# -------------------------------
+# Automatic bumps on ORM writes
+# -------------------------------
+_WATCHED = {
+    Role: ROLES,
+    LeaveApprovalConfig: APPROVAL_CONFIG,
+    Holiday: HOLIDAYS
+}
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_on_flush(session, flush_context):
+    changed = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, CacheVersion):
+            continue
+        name = _WATCHED.get(type(obj))
+        if name:
+            if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+                continue
+            changed.add(name)
+        elif isinstance(obj, Employee):
+            if obj in session.dirty and not db.inspect(obj).attrs.manager_emp_id.history.has_changes():
+                continue
+            changed.add(REPORTING_LINES)
+
+    bumped = session.info.setdefault("ref_cache_bumped", set())
+    for name in changed - bumped:
+        _bump(session.connection(), name)
+        bumped.add(name)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    bumped = session.info.pop("ref_cache_bumped", None)
+    if not bumped:
+        return
+    for name in bumped:
+        invalidate(name)
+    # This request's snapshot of the versions is now stale
+    if has_app_context():
+        g.pop("_ref_versions", None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("ref_cache_bumped", None)
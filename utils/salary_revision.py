@@ -0,0 +1,196 @@
+import json
+import math
+
+from sqlalchemy import func, select, insert, update, literal
+
+from models.db import db
+from models.models import Employee, EmployeeSalary, SalaryRevision, SalaryRevisionAudit
+from utils import payroll_preview
+
+# -------------------------------
+# Bulk salary revisions
+# -------------------------------
+# A revision raises (or cuts) gross salary by a percentage or a fixed
+# amount for the active employees matching a scope: departments, grades
+# (job_title; there is no separate grade column) and/or explicit
+# emp_codes, combined with AND. The preview is one grouped aggregate
+# query; applying is an INSERT ... SELECT snapshot into
+# salary_revision_audit followed by one UPDATE of employee_salary limited
+# to the snapshotted rows, both in one transaction.
+
+PERCENT = "PERCENT"
+AMOUNT = "AMOUNT"
+
+SCOPE_FIELDS = ("departments", "job_titles", "emp_codes")
+NOTE_MAX_LENGTH = 255   # salary_revision.note
+
+
+class RevisionError(Exception):
+    pass
+
+
+def parse_revision(data):
+    """
+    Validates a request body; returns (mode, value, scope).
+    """
+    mode = str(data.get("mode") or "").upper()
+    if mode not in (PERCENT, AMOUNT):
+        raise RevisionError("mode must be PERCENT or AMOUNT")
+
+    try:
+        value = float(data.get("value"))
+    except (TypeError, ValueError):
+        raise RevisionError("value must be a number")
+    if not math.isfinite(value):
+        raise RevisionError("value must be a finite number")
+    if mode == PERCENT and value <= -100:
+        raise RevisionError("A percentage cut must be above -100")
+
+    scope = {}
+    for field in SCOPE_FIELDS:
+        items = data.get(field) or []
+        if not isinstance(items, list):
+            raise RevisionError(f"{field} must be a list")
+        items = sorted({str(i).strip() for i in items if str(i).strip()})
+        if items:
+            scope[field] = items
+    if not scope:
+        # A company-wide revision has to be asked for explicitly
+        if not data.get("all_employees"):
+            raise RevisionError("Give departments, job_titles or emp_codes (or all_employees: true)")
+    return mode, value, scope
+
+
+def _new_gross(mode, value):
+    gross = func.coalesce(EmployeeSalary.gross_salary, 0)
+    if mode == PERCENT:
+        return func.round(gross * (1 + value / 100.0), 2)
+    return func.round(gross + value, 2)
+
+
+def _filters(scope):
+    filters = [Employee.status == "Active"]
+    if scope.get("departments"):
+        filters.append(Employee.department.in_(scope["departments"]))
+    if scope.get("job_titles"):
+        filters.append(Employee.job_title.in_(scope["job_titles"]))
+    if scope.get("emp_codes"):
+        filters.append(Employee.emp_code.in_(scope["emp_codes"]))
+    return filters
+
+
+def preview(mode, value, scope):
+    """
+    Per-department totals before / after, from one grouped query.
+    """
+    new_gross = _new_gross(mode, value)
+    rows = db.session.query(
+        Employee.department,
+        func.count(EmployeeSalary.id),
+        func.sum(EmployeeSalary.gross_salary),
+        func.sum(new_gross),
+        func.min(new_gross)
+    ).join(
+        EmployeeSalary, EmployeeSalary.emp_code == Employee.emp_code
+    ).filter(*_filters(scope)).group_by(Employee.department).all()
+
+    departments = [
+        {
+            "department": dept,
+            "employees": count,
+            "current_total": round(old or 0, 2),
+            "new_total": round(new or 0, 2),
+            "change": round((new or 0) - (old or 0), 2)
+        }
+        for dept, count, old, new, _ in rows
+    ]
+    lowest = min((low for *_, low in rows if low is not None), default=None)
+
+    return {
+        "mode": mode,
+        "value": value,
+        "scope": scope,
+        "employees": sum(d["employees"] for d in departments),
+        "current_total": round(sum(d["current_total"] for d in departments), 2),
+        "new_total": round(sum(d["new_total"] for d in departments), 2),
+        "change": round(sum(d["change"] for d in departments), 2),
+        "lowest_new_salary": lowest,
+        "departments": departments
+    }
+
+
+def apply(mode, value, scope, note=None, user_id=None):
+    """
+    Snapshots and updates the matching salaries; commits. Returns the
+    SalaryRevision.
+    """
+    if note is not None and not isinstance(note, str):
+        raise RevisionError("note must be text")
+    if note and len(note) > NOTE_MAX_LENGTH:
+        raise RevisionError(f"note must be at most {NOTE_MAX_LENGTH} characters")
+
+    revision = SalaryRevision(
+        mode=mode, value=value, scope=json.dumps(scope), note=note, created_by=user_id
+    )
+    db.session.add(revision)
+    db.session.flush()
+
+    # ---------- audit snapshot (INSERT ... SELECT) ----------
+    snapshot = select(
+        literal(revision.id),
+        EmployeeSalary.emp_code,
+        EmployeeSalary.gross_salary,
+        EmployeeSalary.net_salary,
+        _new_gross(mode, value)
+    ).join(
+        Employee, Employee.emp_code == EmployeeSalary.emp_code
+    ).where(*_filters(scope))
+
+    db.session.execute(
+        insert(SalaryRevisionAudit).from_select(
+            ["revision_id", "emp_code", "old_gross_salary", "old_net_salary", "new_gross_salary"],
+            snapshot
+        )
+    )
+
+    affected, lowest = db.session.query(
+        func.count(SalaryRevisionAudit.id), func.min(SalaryRevisionAudit.new_gross_salary)
+    ).filter(SalaryRevisionAudit.revision_id == revision.id).one()
+
+    if lowest is not None and lowest < 0:
+        db.session.rollback()
+        raise RevisionError("The revision would make some salaries negative")
+
+    # ---------- one UPDATE over the snapshotted rows ----------
+    # net_salary follows gross the same way the employee edit form sets it
+    new_gross = _new_gross(mode, value)
+    table = EmployeeSalary.__table__
+    audited = select(SalaryRevisionAudit.emp_code).where(SalaryRevisionAudit.revision_id == revision.id)
+    db.session.execute(
+        update(table)
+        .where(table.c.emp_code.in_(audited))
+        .values(
+            gross_salary=new_gross,
+            net_salary=new_gross - func.coalesce(table.c.total_deductions, 0)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    revision.affected = affected
+    # Pay previews read gross_salary (set-based UPDATE, listener can't see it)
+    payroll_preview.mark_month_on_commit(db.session)
+    db.session.commit()
+    return revision
+
+
+def revision_json(revision):
+    return {
+        "id": revision.id,
+        "mode": revision.mode,
+        "value": revision.value,
+        "scope": json.loads(revision.scope) if revision.scope else {},
+        "note": revision.note,
+        "affected": revision.affected,
+        "created_by": revision.created_by,
+        "created_at": revision.created_at.isoformat() if revision.created_at else None
+    }
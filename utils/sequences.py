@@ -0,0 +1,105 @@
+from sqlalchemy import func, cast, Integer, select, update, text
+
+from models.db import db
+from models.models import Sequence, Employee
+
+# -------------------------------
+# Counter-table sequences
+# -------------------------------
+# allocate() reserves a contiguous block of numbers with one UPDATE on the
+# counter row, so concurrent callers can never get overlapping blocks:
+#   MySQL      UPDATE ... SET next_value = LAST_INSERT_ID(next_value + n)
+#              (LAST_INSERT_ID() is per connection, no extra round trip
+#              to the table)
+#   SQLite/PG  UPDATE ... RETURNING next_value
+# The row lock is held until the caller's transaction ends; numbers of a
+# rolled-back transaction are handed out again.
+
+EMP_CODE = "emp_code"
+
+_table = Sequence.__table__
+
+
+def _initial_values():
+    """
+    Starting point for sequences created on the fly.
+    """
+    last = db.session.query(func.max(cast(Employee.emp_code, Integer))).scalar()
+    return {EMP_CODE: (last or 0) + 1}
+
+
+def _create(name):
+    db.session.add(Sequence(name=name, next_value=_initial_values().get(name, 1)))
+    db.session.flush()
+
+
+def ensure_sequence(name):
+    """
+    Creates the counter row if missing (called at startup).
+    """
+    if db.session.get(Sequence, name) is None:
+        _create(name)
+        db.session.commit()
+
+
+def allocate(name, n=1):
+    """
+    Reserves n consecutive numbers; returns the first one.
+    """
+    if n < 1:
+        raise ValueError("n must be positive")
+
+    connection = db.session.connection()
+    row = update(_table).where(_table.c.name == name)
+    stmt = row.values(next_value=_table.c.next_value + n)
+
+    if connection.dialect.name == "mysql":
+        stmt = row.values(next_value=func.last_insert_id(_table.c.next_value + n))
+        if connection.execute(stmt).rowcount:
+            return connection.execute(text("SELECT LAST_INSERT_ID()")).scalar() - n
+
+    elif connection.dialect.name in ("sqlite", "postgresql"):
+        new_next = connection.execute(stmt.returning(_table.c.next_value)).scalar()
+        if new_next is not None:
+            return new_next - n
+
+    else:
+        current = connection.execute(
+            select(_table.c.next_value).where(_table.c.name == name).with_for_update()
+        ).scalar()
+        if current is not None:
+            connection.execute(stmt)
+            return current
+
+    # No counter row yet; created in the caller's transaction
+    _create(name)
+    return allocate(name, n)
+
+
+def advance_past(name, value):
+    """
+    Moves the sequence beyond a number that was assigned by hand, so
+    allocate() never hands it out.
+    """
+    db.session.execute(
+        update(_table)
+        .where(_table.c.name == name, _table.c.next_value <= value)
+        .values(next_value=value + 1)
+    )
+
+
+def allocate_emp_codes(n=1):
+    """
+    n new employee codes, as strings.
+    """
+    first = allocate(EMP_CODE, n)
+    return [str(first + i) for i in range(n)]
+
+
+def note_emp_code(code):
+    """
+    Keeps the sequence ahead of a manually entered numeric emp_code.
+    """
+    code = str(code).strip()
+    if code.isdigit():
+        advance_past(EMP_CODE, int(code))
@@ -0,0 +1,125 @@
+from datetime import datetime, date, timedelta
+
+from models.db import db
+from models.models import Employee, Leavee
+from utils.business_calendar import working_dates_between
+
+# -------------------------------
+# Who is out, per day, for a team or department
+# -------------------------------
+# One query over the (start_date, end_date) index joined to employees;
+# per-day occupancy is built with a difference array over the range.
+
+CALENDAR_STATUSES = ("APPROVED", "PENDING_L1", "PENDING_L2")
+MAX_RANGE_DAYS = 93
+
+
+def parse_range(args):
+    """
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD, defaulting to the current month.
+    Raises ValueError with a user-facing message.
+    """
+    today = date.today()
+    try:
+        start = datetime.strptime(args["from"], "%Y-%m-%d").date() if args.get("from") else today.replace(day=1)
+        if args.get("to"):
+            end = datetime.strptime(args["to"], "%Y-%m-%d").date()
+        else:
+            next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+            end = next_month - timedelta(days=1)
+    except ValueError:
+        raise ValueError("from / to must be YYYY-MM-DD")
+
+    if end < start:
+        raise ValueError("to must not be before from")
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f"Range is limited to {MAX_RANGE_DAYS} days")
+    return start, end
+
+
+def team_calendar(start, end, manager_emp_id=None, department=None):
+    """
+    Approved and pending absences overlapping [start, end] for the direct
+    reports of manager_emp_id and/or a department, plus per-day counts of
+    people out (non-working days count nobody).
+    """
+    q = db.session.query(
+        Leavee.id, Leavee.emp_code, Leavee.leave_type, Leavee.status,
+        Leavee.start_date, Leavee.end_date,
+        Employee.first_name, Employee.last_name, Employee.department
+    ).join(
+        Employee, Employee.emp_code == Leavee.emp_code
+    ).filter(
+        Leavee.start_date <= end,
+        Leavee.end_date >= start,
+        Leavee.status.in_(CALENDAR_STATUSES)
+    )
+    if manager_emp_id is not None:
+        q = q.filter(Employee.manager_emp_id == manager_emp_id)
+    if department is not None:
+        q = q.filter(Employee.department == department)
+
+    rows = q.order_by(Leavee.start_date, Leavee.emp_code).all()
+
+    span = (end - start).days + 1
+    # Per status: emp_code -> clipped intervals, merged so that overlapping
+    # requests of one person count once per day
+    intervals = {"approved": {}, "pending": {}}
+    for r in rows:
+        kind = "approved" if r.status.upper() == "APPROVED" else "pending"
+        lo = (max(r.start_date, start) - start).days
+        hi = (min(r.end_date, end) - start).days
+        intervals[kind].setdefault(r.emp_code, []).append((lo, hi))
+
+    counts = {}
+    for kind, by_emp in intervals.items():
+        diff = [0] * (span + 1)
+        for spans in by_emp.values():
+            spans.sort()
+            cur_lo, cur_hi = spans[0]
+            for lo, hi in spans[1:]:
+                if lo <= cur_hi + 1:
+                    cur_hi = max(cur_hi, hi)
+                    continue
+                diff[cur_lo] += 1
+                diff[cur_hi + 1] -= 1
+                cur_lo, cur_hi = lo, hi
+            diff[cur_lo] += 1
+            diff[cur_hi + 1] -= 1
+
+        running, out = 0, []
+        for i in range(span):
+            running += diff[i]
+            out.append(running)
+        counts[kind] = out
+
+    working = set(working_dates_between(start, end))
+    days = []
+    for i in range(span):
+        d = start + timedelta(days=i)
+        is_working = d in working
+        days.append({
+            "date": d.strftime("%Y-%m-%d"),
+            "working_day": is_working,
+            "approved": counts["approved"][i] if is_working else 0,
+            "pending": counts["pending"][i] if is_working else 0
+        })
+
+    return {
+        "from": start.strftime("%Y-%m-%d"),
+        "to": end.strftime("%Y-%m-%d"),
+        "absences": [
+            {
+                "id": r.id,
+                "emp_code": r.emp_code,
+                "name": f"{r.first_name} {r.last_name}",
+                "department": r.department,
+                "leave_type": r.leave_type,
+                "status": r.status,
+                "start": r.start_date.strftime("%Y-%m-%d"),
+                "end": r.end_date.strftime("%Y-%m-%d")
+            }
+            for r in rows
+        ],
+        "days": days
+    }
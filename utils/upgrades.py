@@ -0,0 +1,158 @@
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from models.db import db
+from models.models import SchemaUpgrade, Employee, Leavee, PayrollJob, emp_code_number
+
+# -------------------------------
+# Deploy-time upgrades
+# -------------------------------
+# There are no migrations: db.create_all() creates missing tables but
+# never touches existing ones, and a new table derived from existing data
+# starts empty. Each step below runs once per database at startup (after
+# create_all, see app.create_default_admin) and is recorded in
+# schema_upgrade; column and index additions to existing tables go here
+# too. Steps must be idempotent: a fresh database runs them all against
+# tables create_all has just built. On MySQL the whole run holds a named lock, so
+# gunicorn workers starting together apply each step once.
+
+LOCK_NAME = "hr_app_upgrades"
+LOCK_TIMEOUT = 600
+
+
+# -------------------------------
+# Schema changes on existing tables
+# -------------------------------
+def _add_columns(table, *names):
+    """
+    ALTER TABLE ... ADD COLUMN for the model columns the table lacks.
+    """
+    existing = {c["name"] for c in inspect(db.engine).get_columns(table.name)}
+    with db.engine.begin() as connection:
+        for name in names:
+            if name in existing:
+                continue
+            column_ddl = CreateColumn(table.c[name]).compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+
+
+def _create_indexes(*tables):
+    """
+    Creates the declared indexes that are missing from the database.
+    """
+    for table in tables:
+        existing = {ix["name"] for ix in inspect(db.engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+
+
+def backfill_emp_code_num(chunk_size=1000):
+    """
+    Fills employees.emp_code_num for rows written before the column
+    existed. Returns the number of rows changed.
+    """
+    last_id, updated = 0, 0
+    while True:
+        rows = db.session.query(
+            Employee.id, Employee.emp_code, Employee.emp_code_num, Employee.updated_at
+        ).filter(
+            Employee.id > last_id
+        ).order_by(Employee.id).limit(chunk_size).all()
+        if not rows:
+            break
+
+        # updated_at passed through so the onupdate default doesn't touch it
+        # (not a change API consumers need to see)
+        changes = [
+            {"id": r.id, "emp_code_num": emp_code_number(r.emp_code), "updated_at": r.updated_at}
+            for r in rows if r.emp_code_num != emp_code_number(r.emp_code)
+        ]
+        db.session.bulk_update_mappings(Employee, changes)
+        db.session.commit()
+
+        updated += len(changes)
+        last_id = rows[-1].id
+    return updated
+
+
+def _add_emp_code_num():
+    _add_columns(Employee.__table__, "emp_code_num")
+    _create_indexes(Employee.__table__)
+    backfill_emp_code_num()
+
+
+def _add_payroll_job_heartbeat():
+    _add_columns(PayrollJob.__table__, "heartbeat_at")
+
+
+def _create_employee_sort_indexes():
+    _create_indexes(Employee.__table__)
+
+
+def _create_leave_indexes():
+    _create_indexes(Leavee.__table__)
+
+
+# -------------------------------
+# Data backfills
+# -------------------------------
+def _backfill_leave_balance():
+    from utils.leave_workflow import rebuild_balances
+    rebuild_balances()
+
+
+def _backfill_leave_days():
+    from utils.leave_days import rebuild
+    rebuild()
+
+
+# (name, callable), applied in list order. Steps are keyed by name, so a
+# database that already ran later steps still picks up earlier ones; keep
+# column changes ahead of anything that queries the models.
+STEPS = [
+    ("employees_emp_code_num", _add_emp_code_num),
+    ("payroll_job_heartbeat_at", _add_payroll_job_heartbeat),
+    ("employee_leaves_indexes", _create_leave_indexes),
+    ("employees_sort_indexes", _create_employee_sort_indexes),
+    ("leave_balance_backfill", _backfill_leave_balance),
+    ("employee_leave_day_backfill", _backfill_leave_days),
+]
+
+
+@contextmanager
+def _upgrade_lock():
+    if db.engine.dialect.name != "mysql":
+        yield
+        return
+
+    # GET_LOCK belongs to the connection, so keep one aside for the run
+    with db.engine.connect() as connection:
+        if not connection.execute(text("SELECT GET_LOCK(:name, :timeout)"),
+                                  {"name": LOCK_NAME, "timeout": LOCK_TIMEOUT}).scalar():
+            raise RuntimeError("Timed out waiting for another process to finish the upgrades")
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+
+
+def run():
+    """
+    Applies the steps not yet recorded. Returns their names.
+    """
+    applied = []
+    with _upgrade_lock():
+        done = {name for (name,) in db.session.query(SchemaUpgrade.name)}
+        db.session.commit()
+
+        for name, step in STEPS:
+            if name in done:
+                continue
+            step()
+            db.session.add(SchemaUpgrade(name=name))
+            db.session.commit()
+            applied.append(name)
+    return applied